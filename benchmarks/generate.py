@@ -0,0 +1,173 @@
+"""Generate synthetic Actual budget files for the benchmarks."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import datetime
+import io
+import json
+import pathlib
+import random
+import uuid
+import zipfile
+
+from actual.database import (
+    Accounts,
+    Categories,
+    CategoryGroups,
+    Preferences,
+    ReflectBudgets,
+    Transactions,
+    ZeroBudgets,
+)
+from sqlmodel import Session, SQLModel, create_engine
+
+
+@dataclass
+class BudgetShape:
+    """Size of a synthetic budget."""
+
+    accounts: int = 10
+    categories: int = 100
+    months: int = 60
+    transactions: int = 20_000
+    tracking: bool = False
+    seed: int = 0
+
+
+@dataclass
+class GeneratedBudget:
+    file_id: str
+    group_id: str
+    data_dir: pathlib.Path
+    transaction_ids: list[str]
+
+
+def _uuid(rnd: random.Random) -> str:
+    return str(uuid.UUID(int=rnd.getrandbits(128), version=4))
+
+
+def _month_back(today: datetime.date, months: int) -> int:
+    index = today.year * 12 + today.month - 1 - months
+    return (index // 12) * 100 + index % 12 + 1
+
+
+def generate_budget(data_dir: pathlib.Path, shape: BudgetShape) -> GeneratedBudget:
+    """Write ``db.sqlite`` and ``metadata.json`` for ``shape`` into ``data_dir``.
+
+    Budget rows cover every category for the last ``shape.months`` months and
+    transactions are spread uniformly over the same range.
+    """
+    rnd = random.Random(shape.seed)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    (data_dir / "db.sqlite").unlink(missing_ok=True)
+    engine = create_engine(f"sqlite:///{data_dir / 'db.sqlite'}")
+    SQLModel.metadata.create_all(engine)
+
+    today = datetime.date.today()
+    months = [_month_back(today, back) for back in range(shape.months - 1, -1, -1)]
+    budget_table = ReflectBudgets if shape.tracking else ZeroBudgets
+    transaction_ids = []
+    with Session(engine) as session:
+        if shape.tracking:
+            session.add(Preferences(id="budgetType", value="tracking"))
+        income = CategoryGroups(
+            id=_uuid(rnd), name="Income", is_income=1, sort_order=0, tombstone=0
+        )
+        session.add(income)
+        groups = []
+        for index in range(max(1, shape.categories // 10)):
+            group = CategoryGroups(
+                id=_uuid(rnd),
+                name=f"Group {index}",
+                is_income=0,
+                sort_order=index + 1,
+                tombstone=0,
+            )
+            session.add(group)
+            groups.append(group)
+
+        category_ids = []
+        for index in range(shape.categories):
+            category_id = _uuid(rnd)
+            category_ids.append(category_id)
+            session.add(
+                Categories(
+                    id=category_id,
+                    name=f"Category {index}",
+                    cat_group=groups[index % len(groups)].id,
+                    sort_order=index,
+                    is_income=0,
+                    tombstone=0,
+                )
+            )
+            for month in months:
+                session.add(
+                    budget_table(
+                        id=f"{month}-{category_id}",
+                        category_id=category_id,
+                        month=month,
+                        amount=rnd.choice((0, 5000, 10000, 25000, 50000)),
+                        carryover=int(rnd.random() < 0.1),
+                    )
+                )
+
+        account_ids = []
+        for index in range(shape.accounts):
+            account_id = _uuid(rnd)
+            account_ids.append(account_id)
+            session.add(
+                Accounts(
+                    id=account_id,
+                    name=f"Account {index}",
+                    offbudget=0,
+                    closed=0,
+                    sort_order=index,
+                    tombstone=0,
+                )
+            )
+
+        for _ in range(shape.transactions):
+            month = rnd.choice(months)
+            transaction_id = _uuid(rnd)
+            transaction_ids.append(transaction_id)
+            income_row = rnd.random() < 0.05
+            session.add(
+                Transactions(
+                    id=transaction_id,
+                    acct=rnd.choice(account_ids),
+                    category_id=None if income_row else rnd.choice(category_ids),
+                    amount=rnd.randint(100_000, 500_000)
+                    if income_row
+                    else -rnd.randint(100, 20_000),
+                    date=month * 100 + rnd.randint(1, 28),
+                    is_parent=0,
+                    is_child=0,
+                    tombstone=0,
+                )
+            )
+        session.commit()
+    engine.dispose()
+
+    file_id = _uuid(rnd)
+    group_id = _uuid(rnd)
+    (data_dir / "metadata.json").write_text(
+        json.dumps(
+            {
+                "id": f"benchmark-{shape.seed}",
+                "budgetName": "Benchmark",
+                "cloudFileId": file_id,
+                "groupId": group_id,
+            }
+        )
+    )
+    return GeneratedBudget(file_id, group_id, data_dir, transaction_ids)
+
+
+def pack_budget(budget: GeneratedBudget) -> bytes:
+    """Zip the budget the way the Actual server serves it for download."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name in ("db.sqlite", "metadata.json"):
+            archive.write(budget.data_dir / name, name)
+    return buffer.getvalue()
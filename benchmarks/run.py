@@ -0,0 +1,292 @@
+"""Time the integration's hot paths against a synthetic budget.
+
+Run from the repository root, in an environment with Home Assistant and the
+integration's requirements installed:
+
+    python -m benchmarks.run --categories 200 --months 120 --transactions 100000
+
+Every scenario talks to a local stand-in server over HTTP, so the numbers
+include the integration's real request and SQLite work. Change checks go over
+the aiohttp transport, as they do in Home Assistant.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import pathlib
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List
+
+import aiohttp
+
+from custom_components.actualbudget.actualbudget import ActualBudget
+from custom_components.actualbudget.connection import ConnectionKey
+from custom_components.actualbudget.coordinator import changed_contexts
+from custom_components.actualbudget.sensor import ActualBudgetBudgetSensor
+from custom_components.actualbudget.transactions import (
+    METRICS,
+    PERIODS,
+    TransactionQuery,
+)
+from custom_components.actualbudget.transport import AsyncTransport
+
+from .generate import BudgetShape, GeneratedBudget, generate_budget, pack_budget
+from .server import StandInServer
+
+
+class _Config:
+    def __init__(self, root: pathlib.Path) -> None:
+        self.root = root
+
+    def path(self, *parts: str) -> str:
+        return str(self.root.joinpath(*parts))
+
+
+class _Hass:
+    """The part of ``HomeAssistant`` that ``ActualBudget`` uses off the loop."""
+
+    def __init__(self, root: pathlib.Path) -> None:
+        self.config = _Config(root)
+
+
+def _measure(
+    action: Callable[[], object],
+    repeat: int,
+    setup: Callable[[], object] | None = None,
+) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        action()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def _report(name: str, samples: List[float], note: str = "") -> None:
+    print(
+        f"{name:<22} p50 {_percentile(samples, 0.5) * 1000:9.2f} ms"
+        f"  p95 {_percentile(samples, 0.95) * 1000:9.2f} ms"
+        f"  n={len(samples)}{'  ' + note if note else ''}"
+    )
+
+
+def _peak_rss_mib() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run(args: argparse.Namespace, workdir: pathlib.Path) -> None:
+    shape = BudgetShape(
+        accounts=args.accounts,
+        categories=args.categories,
+        months=args.months,
+        transactions=args.transactions,
+        tracking=args.tracking,
+        seed=args.seed,
+    )
+    start = time.perf_counter()
+    budget = generate_budget(workdir / "source", shape)
+    archive = pack_budget(budget)
+    print(
+        f"generated {shape} in {time.perf_counter() - start:.1f} s,"
+        f" archive {len(archive) / 1024 / 1024:.1f} MiB"
+    )
+
+    server = StandInServer(budget.file_id, budget.group_id, archive).start()
+    loop = asyncio.new_event_loop()
+    http = loop.run_until_complete(_open_http())
+    try:
+        _run_scenarios(args, workdir, budget, server, loop, http)
+    finally:
+        loop.run_until_complete(http.close())
+        loop.close()
+        server.stop()
+
+
+async def _open_http() -> aiohttp.ClientSession:
+    return aiohttp.ClientSession()
+
+
+def _run_scenarios(
+    args: argparse.Namespace,
+    workdir: pathlib.Path,
+    budget: GeneratedBudget,
+    server: StandInServer,
+    loop: asyncio.AbstractEventLoop,
+    http: aiohttp.ClientSession,
+) -> None:
+    config_dir = workdir / "config"
+    rnd = random.Random(args.seed)
+    transport = AsyncTransport(http, ConnectionKey(server.url, "benchmark", None))
+
+    def make_api() -> ActualBudget:
+        return ActualBudget(
+            _Hass(config_dir),
+            server.url,
+            "benchmark",
+            budget.file_id,
+            None,
+            None,
+            history_months=args.history_months,
+            index_transactions=args.index_transactions,
+            transport=transport,
+        )
+
+    def open_session(api: ActualBudget) -> None:
+        with api._lock:
+            api._ensure_session()
+
+    cold = []
+    for _ in range(args.session_repeat):
+        shutil.rmtree(config_dir, ignore_errors=True)
+        api = make_api()
+        cold += _measure(lambda: open_session(api), 1)
+        api.close()
+    _report("session (download)", cold)
+
+    warm = []
+    for _ in range(args.session_repeat):
+        api = make_api()
+        warm += _measure(lambda: open_session(api), 1)
+        api.close()
+    _report("session (reopen)", warm)
+
+    api = make_api()
+    open_session(api)
+    live = _measure(lambda: open_session(api), args.repeat)
+    _report("session (live)", live)
+
+    _report(
+        "refresh (full)",
+        _measure(api._fetch_all_sync, args.repeat, setup=api._tracker.invalidate),
+    )
+    _report("refresh (no changes)", _measure(api._fetch_all_sync, args.repeat))
+
+    def queue_changes() -> None:
+        for transaction_id in rnd.sample(budget.transaction_ids, args.changes):
+            server.queue_change(
+                "transactions", transaction_id, "amount", -rnd.randint(100, 20_000)
+            )
+
+    _report(
+        "refresh (incremental)",
+        _measure(api._fetch_all_sync, args.repeat, setup=queue_changes),
+        f"{args.changes} changed transactions",
+    )
+
+    _report(
+        "change check (idle)",
+        _measure(
+            lambda: loop.run_until_complete(api.has_remote_changes()), args.repeat
+        ),
+        f"{api.last_check_bytes} bytes received",
+    )
+
+    month_key = int(datetime.date.today().strftime("%Y%m"))
+
+    def build_all_attributes() -> None:
+        for entry in api._snapshot.budgets.values():
+            ActualBudgetBudgetSensor._build_attributes(entry, month_key)
+
+    _report(
+        "attributes (all)",
+        _measure(build_all_attributes, args.repeat),
+        f"{len(api._snapshot.budgets)} budget sensors",
+    )
+
+    if args.index_transactions:
+        index = api._snapshot.transactions
+        today = datetime.date.today()
+        queries = [
+            TransactionQuery(metric, period)
+            for metric in METRICS
+            for period in PERIODS
+        ]
+
+        def run_queries() -> None:
+            for query in queries:
+                index.query(query, today)
+
+        _report(
+            "transaction queries",
+            _measure(run_queries, args.repeat),
+            f"{len(queries)} queries over {len(index)} transactions",
+        )
+
+    # Entity update fan-out: diff two snapshots, then rebuild the attributes
+    # of the sensors whose entry changed.
+    notified = []
+    fan_out = []
+    for _ in range(args.repeat):
+        previous = api._snapshot
+        queue_changes()
+        current = api._fetch_all_sync()
+        start = time.perf_counter()
+        contexts = changed_contexts(previous, current) or set()
+        for kind, entry_id in contexts:
+            if kind == "budget" and entry_id in current.budgets:
+                ActualBudgetBudgetSensor._build_attributes(
+                    current.budgets[entry_id], month_key
+                )
+        fan_out.append(time.perf_counter() - start)
+        notified.append(len(contexts))
+    total = len(current.accounts) + len(current.budgets)
+    _report(
+        "entity fan-out",
+        fan_out,
+        f"{sum(notified) / len(notified):.1f} of {total} entities notified",
+    )
+
+    tracemalloc.start()
+    with api._lock:
+        snapshot = api._build_snapshot(api.actual.session, datetime.date.today())
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{'snapshot memory':<22} retained {retained / 1024 / 1024:6.2f} MiB"
+        f"  build peak {peak / 1024 / 1024:6.2f} MiB"
+        f"  ({len(snapshot.budgets)} budgets, {len(snapshot.accounts)} accounts)"
+    )
+    api.close()
+    print(f"{'peak RSS':<22} {_peak_rss_mib():.1f} MiB")
+    print(f"{'server requests':<22} {server.requests}")
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=10)
+    parser.add_argument("--categories", type=int, default=100)
+    parser.add_argument("--months", type=int, default=60)
+    parser.add_argument("--transactions", type=int, default=20_000)
+    parser.add_argument("--tracking", action="store_true", help="tracking budget")
+    parser.add_argument("--history-months", type=int, default=0)
+    parser.add_argument(
+        "--index-transactions", action="store_true", help="build the transaction index"
+    )
+    parser.add_argument("--changes", type=int, default=5, help="per incremental sync")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--session-repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir:
+        run(args, pathlib.Path(workdir))
+
+
+if __name__ == "__main__":
+    main()
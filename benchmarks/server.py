@@ -0,0 +1,119 @@
+"""Local stand-in for the Actual server endpoints the integration calls."""
+
+from __future__ import annotations
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+from typing import List
+
+from actual.protobuf_models import (
+    HULC_Client,
+    Message,
+    MessageEnvelope,
+    SyncRequest,
+    SyncResponse,
+)
+
+TOKEN = "benchmark-token"
+
+
+class StandInServer:
+    """Serve one budget file over HTTP on a free localhost port.
+
+    Sync requests answer with the messages queued through ``queue_change``
+    that are newer than the request's ``since`` timestamp, which lets a
+    benchmark drive incremental refreshes and change checks.
+    """
+
+    def __init__(self, file_id: str, group_id: str, archive: bytes) -> None:
+        self.file_id = file_id
+        self.group_id = group_id
+        self.archive = archive
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._messages: List[MessageEnvelope] = []
+        self._clock = HULC_Client(client_id="BE0C4BE0C4BE0C4B")
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _handler(self))
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> StandInServer:
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def queue_change(self, dataset: str, row: str, column: str, value) -> None:
+        message = Message({"dataset": dataset, "row": row, "column": column})
+        message.set_value(value)
+        envelope = MessageEnvelope(
+            {"content": Message.serialize(message), "isEncrypted": False}
+        )
+        with self._lock:
+            envelope.timestamp = self._clock.timestamp()
+            self._messages.append(envelope)
+
+    def changes_since(self, body: bytes) -> bytes:
+        since = SyncRequest.deserialize(body).since
+        with self._lock:
+            # HULC timestamps sort lexicographically.
+            newer = [m for m in self._messages if m.timestamp > since]
+        return SyncResponse.serialize(SyncResponse({"messages": newer, "merkle": "{}"}))
+
+
+def _handler(server: StandInServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+        def _send(self, body: bytes, content_type="application/json") -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _json(self, data) -> None:
+            self._send(json.dumps({"status": "ok", "data": data}).encode())
+
+        def do_GET(self) -> None:
+            server.requests += 1
+            if self.path == "/account/validate":
+                return self._json({"validated": True})
+            if self.path == "/sync/list-user-files":
+                return self._json(
+                    [
+                        {
+                            "deleted": 0,
+                            "fileId": server.file_id,
+                            "groupId": server.group_id,
+                            "name": "Benchmark",
+                            "encryptKeyId": None,
+                        }
+                    ]
+                )
+            if self.path == "/sync/download-user-file":
+                return self._send(server.archive, "application/octet-stream")
+            if self.path == "/data-file-index.txt":
+                return self._send(b"default-db.sqlite\n", "text/plain")
+            self.send_error(404)
+
+        def do_POST(self) -> None:
+            server.requests += 1
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path == "/account/login":
+                return self._json({"token": TOKEN})
+            if self.path == "/sync/sync":
+                return self._send(server.changes_since(body), "application/actual-sync")
+            self.send_error(404)
+
+    return Handler
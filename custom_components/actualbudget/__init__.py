@@ -1,24 +1,43 @@
 """The actualbudget integration."""
 
 from __future__ import annotations
+from datetime import timedelta
 from urllib.parse import urlparse
 import logging
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import (HomeAssistant)
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.typing import ConfigType
 
 from .actions import register_actions
 from .actualbudget import ActualBudget
+from .connection import ConnectionKey, ConnectionPool
 from .const import (
     CONFIG_CERT,
+    CONFIG_CHANGE_CHECK_INTERVAL,
+    CONFIG_CHANGE_THRESHOLD,
     CONFIG_ENCRYPT_PASSWORD,
     CONFIG_ENDPOINT,
     CONFIG_FILE,
+    CONFIG_HISTORY_MONTHS,
+    CONFIG_MAX_UPDATE_INTERVAL,
+    CONFIG_MIN_UPDATE_INTERVAL,
     CONFIG_PASSWORD,
+    CONFIG_TRANSACTION_SENSORS,
+    DATA_CONNECTIONS,
+    DEFAULT_CHANGE_CHECK_INTERVAL,
+    DEFAULT_CHANGE_THRESHOLD,
+    DEFAULT_HISTORY_MONTHS,
+    DEFAULT_MAX_UPDATE_INTERVAL,
+    DEFAULT_MIN_UPDATE_INTERVAL,
     DOMAIN,
 )
-from .coordinator import ActualBudgetCoordinator
+from .coordinator import STORAGE_VERSION, ActualBudgetCoordinator
+from .executor import ActualExecutor
+from .transactions import parse_transaction_sensors
+from .transport import AsyncTransport, ssl_option
 
 __version__ = "3.0.0"
 _LOGGER = logging.getLogger(__name__)
@@ -31,6 +50,7 @@ async def async_setup(hass: HomeAssistant, config: ConfigType):
     _LOGGER.debug("Start 'async_setup'...")
 
     hass.data.setdefault(DOMAIN, {})
+    hass.data.setdefault(DATA_CONNECTIONS, ConnectionPool())
 
     register_actions(hass)
 
@@ -44,6 +64,19 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     if cert == "SKIP":
         cert = False
 
+    # Files on the same server with the same login share one connection.
+    pool: ConnectionPool = hass.data[DATA_CONNECTIONS]
+    key = ConnectionKey(config[CONFIG_ENDPOINT], config[CONFIG_PASSWORD], cert)
+    connection = pool.acquire(key)
+    transport = AsyncTransport(
+        async_get_clientsession(hass),
+        key,
+        await hass.async_add_executor_job(ssl_option, cert),
+    )
+    transaction_sensors = parse_transaction_sensors(
+        entry.options.get(CONFIG_TRANSACTION_SENSORS)
+    )
+    executor = ActualExecutor(f"actualbudget_{config[CONFIG_FILE]}")
     api = ActualBudget(
         hass,
         config[CONFIG_ENDPOINT],
@@ -51,10 +84,28 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         config[CONFIG_FILE],
         cert,
         config.get(CONFIG_ENCRYPT_PASSWORD),
+        connection=connection,
+        history_months=entry.options.get(CONFIG_HISTORY_MONTHS, DEFAULT_HISTORY_MONTHS),
+        index_transactions=bool(transaction_sensors),
+        executor=executor,
+        transport=transport,
     )
 
-    coordinator = ActualBudgetCoordinator(hass, api)
-    await coordinator.async_config_entry_first_refresh()
+    coordinator = ActualBudgetCoordinator(
+        hass, api, *_scheduler_options(entry), store=_snapshot_store(hass, entry)
+    )
+    if await coordinator.async_restore():
+        # Entities start from the saved snapshot; a slow or unreachable
+        # server no longer holds up setup.
+        entry.async_create_background_task(
+            hass, coordinator.async_refresh(), "actualbudget first refresh"
+        )
+    else:
+        try:
+            await coordinator.async_config_entry_first_refresh()
+        except Exception:
+            await _async_close_api(hass, api)
+            raise
 
     # Compute a stable source id used for entity unique_ids.
     endpoint = config[CONFIG_ENDPOINT]
@@ -65,15 +116,93 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         "api": api,
         "coordinator": coordinator,
         "unique_source_id": unique_source_id,
+        "transaction_sensors": transaction_sensors,
     }
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    coordinator.set_change_check_interval(_change_check_interval(entry))
+    entry.async_on_unload(lambda: coordinator.set_change_check_interval(None))
+    entry.async_on_unload(entry.add_update_listener(_async_options_updated))
     return True
 
 
+def _snapshot_store(hass: HomeAssistant, entry: ConfigEntry) -> Store:
+    """Storage for the entry's last snapshot."""
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}")
+
+
+def _scheduler_options(entry: ConfigEntry) -> tuple[timedelta, timedelta, int]:
+    """Return (min interval, max interval, change threshold) from entry options."""
+    options = entry.options
+    min_interval = timedelta(
+        minutes=options.get(CONFIG_MIN_UPDATE_INTERVAL, DEFAULT_MIN_UPDATE_INTERVAL)
+    )
+    max_interval = timedelta(
+        minutes=options.get(CONFIG_MAX_UPDATE_INTERVAL, DEFAULT_MAX_UPDATE_INTERVAL)
+    )
+    change_threshold = options.get(CONFIG_CHANGE_THRESHOLD, DEFAULT_CHANGE_THRESHOLD)
+    return min_interval, max(min_interval, max_interval), change_threshold
+
+
+def _change_check_interval(entry: ConfigEntry) -> timedelta | None:
+    """Return the change check interval from entry options, None if disabled."""
+    seconds = entry.options.get(
+        CONFIG_CHANGE_CHECK_INTERVAL, DEFAULT_CHANGE_CHECK_INTERVAL
+    )
+    return timedelta(seconds=seconds) if seconds else None
+
+
+async def _async_options_updated(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Apply new options without reloading the entry.
+
+    Changing the transaction sensors adds or removes entities, so that one
+    reloads the entry.
+    """
+    entry_data = hass.data[DOMAIN][entry.entry_id]
+    transaction_sensors = parse_transaction_sensors(
+        entry.options.get(CONFIG_TRANSACTION_SENSORS)
+    )
+    if transaction_sensors != entry_data["transaction_sensors"]:
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+
+    coordinator: ActualBudgetCoordinator = entry_data["coordinator"]
+    coordinator.set_interval_bounds(*_scheduler_options(entry))
+    coordinator.set_change_check_interval(_change_check_interval(entry))
+    api: ActualBudget = entry_data["api"]
+    history_months = entry.options.get(CONFIG_HISTORY_MONTHS, DEFAULT_HISTORY_MONTHS)
+    if (history_months or None) != api.history_months:
+        await api.run_job(api.set_history_months, history_months)
+        await coordinator.async_request_refresh()
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     unloaded = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unloaded:
-        hass.data[DOMAIN].pop(entry.entry_id, None)
+        entry_data = hass.data[DOMAIN].pop(entry.entry_id, None)
+        if entry_data is not None:
+            await _async_close_api(hass, entry_data["api"])
     return unloaded
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Delete the saved snapshot of a removed entry."""
+    await _snapshot_store(hass, entry).async_remove()
+
+
+async def _async_close_api(hass: HomeAssistant, api: ActualBudget) -> None:
+    """Cancel the entry's queued jobs, then close its session.
+
+    Closing runs on Home Assistant's executor, as the entry's own no longer
+    accepts jobs; it waits for a running job to release the session lock.
+    """
+    if api.executor is not None:
+        api.executor.shutdown()
+    await hass.async_add_executor_job(_close_api, hass, api)
+
+
+def _close_api(hass: HomeAssistant, api: ActualBudget) -> None:
+    """Close the entry's budget session and release its shared connection."""
+    api.close()
+    hass.data[DATA_CONNECTIONS].release(api.connection)
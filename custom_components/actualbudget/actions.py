@@ -1,7 +1,10 @@
 """Service actions for ActualBudget integration."""
 
 from __future__ import annotations
+import asyncio
 import logging
+import time
+from typing import Dict, Hashable
 
 import voluptuous as vol
 
@@ -9,32 +12,100 @@ from homeassistant.core import (
     HomeAssistant,
     ServiceCall,
     ServiceResponse,
+    SupportsResponse,
     callback,
 )
 from homeassistant.config_entries import ConfigEntry, ConfigEntryState
-from homeassistant.exceptions import ServiceValidationError
+from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
+import homeassistant.helpers.config_validation as cv
 
-from .actualbudget import ActualBudget
+from .actualbudget import ActualBudget, BudgetNotDownloadedError
+from .banksync import DEFAULT_PARALLEL, MAX_PARALLEL
 from .const import (
     ATTR_CONFIG_ENTRY_ID,
     DOMAIN,
 )
 from .coordinator import ActualBudgetCoordinator
+from .executor import ExecutorBusyError
+from .query import GROUP_BY, QUERY_TRANSACTIONS, QUERY_TYPES, QueryRequest
 
 _LOGGER = logging.getLogger(__name__)
 
 
+SYNC_BANK = "bank_sync"
+SYNC_BUDGET = "budget_sync"
+QUERY = "query"
+
+
+def _bank_sync_key(account_ids: list[str] | None) -> Hashable:
+    """In-flight key of a bank sync of ``account_ids`` (None: all accounts)."""
+    return SYNC_BANK if account_ids is None else (SYNC_BANK, frozenset(account_ids))
+
+
+def _is_bank_sync(key: Hashable) -> bool:
+    return key == SYNC_BANK or (isinstance(key, tuple) and key[0] == SYNC_BANK)
+
+
+def _satisfied_by(kind: Hashable, in_flight: Dict[Hashable, asyncio.Task]) -> list:
+    """Keys of in-flight syncs a new ``kind`` request can attach to.
+
+    A bank sync of all accounts covers any selection of them, and every bank
+    sync pulls the budget too, so it absorbs budget syncs.
+    """
+    if kind == SYNC_BUDGET:
+        return [SYNC_BUDGET, *(key for key in in_flight if key != SYNC_BUDGET)]
+    return [kind, SYNC_BANK]
+
+
 async def _run_sync(
     coordinator: ActualBudgetCoordinator,
+    kind: Hashable,
     action,
-) -> None:
-    """Run a sync action with visible in-progress state for dashboard cards."""
+):
+    """Run a sync action, coalescing with an equivalent one already in flight.
+
+    Callers that arrive while a matching sync runs await that sync's result
+    instead of repeating it. The shared task is shielded so one caller being
+    cancelled does not cancel it for the others. Bank syncs that cannot
+    attach wait for the running one, so no account is synced twice at once.
+    """
+    in_flight = coordinator.sync_tasks
+    while True:
+        for other in _satisfied_by(kind, in_flight):
+            task = in_flight.get(other)
+            if task is not None:
+                _LOGGER.debug("Attaching %s to in-flight %s", kind, other)
+                coordinator.syncs_coalesced += 1
+                return await asyncio.shield(task)
+        if not _is_bank_sync(kind):
+            break
+        running = [task for key, task in in_flight.items() if _is_bank_sync(key)]
+        if not running:
+            break
+        _LOGGER.debug("Waiting for the running bank sync before %s", kind)
+        await asyncio.wait(running)
+
+    task = coordinator.hass.async_create_task(_sync_and_refresh(coordinator, action))
+    in_flight[kind] = task
     coordinator.set_syncing(True)
+
+    def _done(_task: asyncio.Task) -> None:
+        if in_flight.get(kind) is task:
+            del in_flight[kind]
+        coordinator.set_syncing(bool(in_flight))
+
+    task.add_done_callback(_done)
+    return await asyncio.shield(task)
+
+
+async def _sync_and_refresh(coordinator: ActualBudgetCoordinator, action):
+    """Run a sync action, refresh the coordinator and return the action's result."""
     try:
-        await action()
-        await coordinator.async_refresh()
-    finally:
-        coordinator.set_syncing(False)
+        result = await action()
+    except ExecutorBusyError as err:
+        raise HomeAssistantError(f"ActualBudget is busy: {err}") from err
+    await coordinator.async_refresh()
+    return result
 
 
 @callback
@@ -53,17 +124,22 @@ def register_actions(hass: HomeAssistant) -> None:
     """Register custom actions."""
     hass.services.async_register(
         DOMAIN,
-        "bank_sync",
+        SYNC_BANK,
         handle_bank_sync,
         schema=vol.Schema(
             {
                 vol.Required(ATTR_CONFIG_ENTRY_ID): str,
+                vol.Optional("accounts"): vol.All(cv.ensure_list, [str]),
+                vol.Optional("max_parallel", default=DEFAULT_PARALLEL): vol.All(
+                    vol.Coerce(int), vol.Range(min=1, max=MAX_PARALLEL)
+                ),
             }
         ),
+        supports_response=SupportsResponse.OPTIONAL,
     )
     hass.services.async_register(
         DOMAIN,
-        "budget_sync",
+        SYNC_BUDGET,
         handle_budget_sync,
         schema=vol.Schema(
             {
@@ -71,17 +147,71 @@ def register_actions(hass: HomeAssistant) -> None:
             }
         ),
     )
+    hass.services.async_register(
+        DOMAIN,
+        QUERY,
+        handle_query,
+        schema=vol.Schema(
+            {
+                vol.Required(ATTR_CONFIG_ENTRY_ID): str,
+                vol.Required("type"): vol.In(QUERY_TYPES),
+                vol.Optional("start"): cv.date,
+                vol.Optional("end"): cv.date,
+                vol.Optional("group_by"): vol.In(GROUP_BY),
+                vol.Optional("name"): str,
+            }
+        ),
+        supports_response=SupportsResponse.ONLY,
+    )
 
 
 async def handle_bank_sync(call: ServiceCall) -> ServiceResponse:
-    """Handle the bank_sync service action call."""
+    """Handle the bank_sync service action call.
+
+    Responds with the outcome of each account. A call that joined a bank
+    sync already in flight gets that sync's results for its own accounts.
+    """
     entry_id = call.data[ATTR_CONFIG_ENTRY_ID]
     _LOGGER.debug("actualbudget.bank_sync invoked for entry %s", entry_id)
     entry_data = _get_entry_data(call.hass, entry_id)
     api: ActualBudget = entry_data["api"]
     coordinator: ActualBudgetCoordinator = entry_data["coordinator"]
-    await _run_sync(coordinator, api.run_bank_sync)
+    account_ids = _resolve_accounts(coordinator, call.data.get("accounts"))
+    max_parallel = call.data["max_parallel"]
+    started = time.perf_counter()
+    results = await _run_sync(
+        coordinator,
+        _bank_sync_key(account_ids),
+        lambda: api.run_bank_sync(account_ids, max_parallel),
+    )
+    if account_ids is not None:
+        # An attached call may share the results of a sync of all accounts.
+        requested = set(account_ids)
+        results = [result for result in results if result.account_id in requested]
     _LOGGER.debug("actualbudget.bank_sync completed for entry %s", entry_id)
+    return {
+        "duration": time.perf_counter() - started,
+        "accounts": [result.as_dict() for result in results],
+    }
+
+
+@callback
+def _resolve_accounts(
+    coordinator: ActualBudgetCoordinator, accounts: list[str] | None
+) -> list[str] | None:
+    """Map account names or ids to ids, using the current snapshot."""
+    if not accounts:
+        return None
+    data = coordinator.data
+    if data is None:
+        raise ServiceValidationError("No budget data loaded yet")
+    account_ids = []
+    for account in accounts:
+        account_id = account if account in data.accounts else data.account_ids_by_name.get(account)
+        if account_id is None:
+            raise ServiceValidationError(f"Unknown account: {account}")
+        account_ids.append(account_id)
+    return account_ids
 
 
 async def handle_budget_sync(call: ServiceCall) -> ServiceResponse:
@@ -91,5 +221,38 @@ async def handle_budget_sync(call: ServiceCall) -> ServiceResponse:
     entry_data = _get_entry_data(call.hass, entry_id)
     api: ActualBudget = entry_data["api"]
     coordinator: ActualBudgetCoordinator = entry_data["coordinator"]
-    await _run_sync(coordinator, api.run_budget_sync)
+    await _run_sync(coordinator, SYNC_BUDGET, api.run_budget_sync)
     _LOGGER.debug("actualbudget.budget_sync completed for entry %s", entry_id)
+
+
+async def handle_query(call: ServiceCall) -> ServiceResponse:
+    """Handle the query service action call.
+
+    Served from the coordinator's current snapshot; never triggers a sync.
+    """
+    entry_data = _get_entry_data(call.hass, call.data[ATTR_CONFIG_ENTRY_ID])
+    api: ActualBudget = entry_data["api"]
+    coordinator: ActualBudgetCoordinator = entry_data["coordinator"]
+    request = QueryRequest(
+        type=call.data["type"],
+        start=call.data.get("start"),
+        end=call.data.get("end"),
+        group_by=call.data.get("group_by"),
+        name=call.data.get("name"),
+    )
+    if request.start and request.end and request.start > request.end:
+        raise ServiceValidationError("start must not be after end")
+    if request.group_by and request.type != QUERY_TRANSACTIONS:
+        raise ServiceValidationError("group_by only applies to transactions")
+    if request.name and request.type == QUERY_TRANSACTIONS:
+        raise ServiceValidationError("name only applies to accounts and budgets")
+    if coordinator.data is None:
+        raise ServiceValidationError("No budget data loaded yet")
+    try:
+        return await api.query(coordinator.data, request)
+    except ExecutorBusyError as err:
+        raise HomeAssistantError(f"ActualBudget is busy: {err}") from err
+    except BudgetNotDownloadedError as err:
+        raise HomeAssistantError(
+            translation_domain=DOMAIN, translation_key="budget_not_downloaded"
+        ) from err
@@ -2,213 +2,1060 @@
 
 from __future__ import annotations
 
+from array import array
+import asyncio
+import base64
 import pathlib
-from dataclasses import dataclass, field
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
 from decimal import Decimal
 import datetime
+from itertools import accumulate
+import json
 import logging
+import sqlite3
 import threading
-from typing import Dict, List
+import time
+from typing import Collection, Deque, Dict, List
 
+import aiohttp
 from actual import Actual
+from actual.api.models import (
+    BankSyncErrorDTO,
+    BankSyncResponseDTO,
+    BankSyncStatusDTO,
+    Endpoints,
+)
+from actual.crypto import create_key_buffer, decrypt_from_meta
+from actual.database import Accounts
 from actual.exceptions import (
+    ActualDecryptionError,
     AuthorizationError,
-    InvalidFile,
-    InvalidZipFile,
     UnknownFileId,
 )
-from actual.queries import (
-    get_accounts,
-    get_accumulated_budgeted_balance,
-    get_budgets,
+from actual.utils.conversions import cents_to_decimal
+from requests.exceptions import ConnectionError, HTTPError, SSLError
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session
+
+from .aggregation import (
+    BudgetAggregates,
+    TransactionGroup,
+    aggregate_accounts,
+    aggregate_budgets,
+    aggregate_transactions,
+    month_to_int,
+)
+from .banksync import (
+    DEFAULT_PARALLEL,
+    STATUS_FAILED,
+    STATUS_IMPORTED,
+    BankSyncAccount,
+    BankSyncResult,
+    plan_bank_sync,
 )
-from requests.exceptions import ConnectionError, SSLError
+from .changes import ChangeTracker, TouchedEntities, TrackedActual
+from .connection import ConnectionKey, ServerConnection, Traffic
+from .download import wal_files
+from .executor import ActualExecutor
+from .query import (
+    QUERY_ACCOUNTS,
+    QUERY_BUDGETS,
+    QueryRequest,
+    format_transactions,
+    query_accounts,
+    query_budgets,
+)
+from .transactions import TransactionIndex
+from .transport import AsyncTransport, PulledChanges
 
 
 _LOGGER = logging.getLogger(__name__)
 
-SESSION_TIMEOUT = datetime.timedelta(minutes=30)
+RECONNECT_BACKOFF_MIN = datetime.timedelta(seconds=30)
+RECONNECT_BACKOFF_MAX = datetime.timedelta(minutes=30)
+# Number of refreshes kept for diagnostics.
+REFRESH_HISTORY = 50
+# Query results memoized for the current snapshot.
+QUERY_CACHE_SIZE = 64
 
 
-@dataclass
+class BudgetNotDownloadedError(RuntimeError):
+    """Raised when a query needs the local copy before it was downloaded."""
+
+
+@dataclass(slots=True)
 class BudgetMonth:
     month: str
     budgeted: float | None
     spent: float | None
 
 
-@dataclass
+@dataclass(slots=True)
 class Budget:
+    """A category's history, stored as parallel arrays indexed by month.
+
+    Month keys are YYYYMM ints and amounts are int cents, so a category holds
+    a handful of arrays instead of one object per month. ``BudgetMonth``
+    views are built on demand.
+    """
+
+    id: str
     name: str
-    months: List[BudgetMonth] = field(default_factory=list)
     accumulated_balance: Decimal = Decimal(0)
+    # Cents budgeted before the first loaded month (history window).
+    budgeted_before: int = 0
+    month_keys: array = field(default_factory=lambda: array("i"))
+    budgeted: array = field(default_factory=lambda: array("q"))
+    spent: array = field(default_factory=lambda: array("q"))
+    # Budgeted total up to and including each month, filled by finalize().
+    running_budgeted: array = field(default_factory=lambda: array("q"))
 
+    def append(self, month_key: int, budgeted: int, spent: int) -> None:
+        """Add a month; months must be appended in ascending order."""
+        self.month_keys.append(month_key)
+        self.budgeted.append(budgeted)
+        self.spent.append(spent)
 
-@dataclass
+    def finalize(self) -> None:
+        """Precompute the running budgeted totals."""
+        self.running_budgeted = array(
+            "q", accumulate(self.budgeted, initial=self.budgeted_before)
+        )[1:]
+
+    def month_index(self, month_key: int) -> int:
+        """Index of the last month not after ``month_key`` (YYYYMM), or -1."""
+        return bisect_right(self.month_keys, month_key) - 1
+
+    def month(self, index: int) -> BudgetMonth:
+        budgeted = self.budgeted[index]
+        return BudgetMonth(
+            month=str(self.month_keys[index]),
+            budgeted=budgeted / 100 if budgeted else None,
+            spent=self.spent[index] / 100,
+        )
+
+    def total_budgeted(self, index: int) -> float:
+        return self.running_budgeted[index] / 100
+
+
+@dataclass(slots=True)
 class Account:
+    id: str
     name: str | None
     balance: Decimal
 
 
+@dataclass
+class SessionStats:
+    """Counters describing how the long-lived Actual session was kept alive."""
+
+    reconnects: int = 0
+    validations_avoided: int = 0
+    token_refreshes: int = 0
+    consecutive_failures: int = 0
+
+
+@dataclass
+class RefreshStats:
+    """Where the time of one refresh went.
+
+    Durations are in seconds. ``update_total``, ``notify`` and ``entities_notified`` are
+    filled in by the coordinator once the refresh reached it.
+    """
+
+    started_at: datetime.datetime = field(default_factory=datetime.datetime.now)
+    # "full", "incremental", "unchanged" or "deferred" (a bank sync held the
+    # session, the published snapshot was returned).
+    mode: str | None = None
+    lock_wait: float = 0.0
+    total: float = 0.0
+    phases: Dict[str, float] = field(default_factory=dict)
+    rows: Dict[str, int] = field(default_factory=dict)
+    messages: int = 0
+    requests: int = 0
+    bytes_received: int = 0
+    error: str | None = None
+    update_total: float | None = None
+    notify: float | None = None
+    entities_notified: int | None = None
+
+    @contextmanager
+    def phase(self, name: str):
+        """Add the duration of the ``with`` block to phase ``name``."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = (
+                self.phases.get(name, 0.0) + time.perf_counter() - started
+            )
+
+    def add_timings(self, timings: Dict[str, float]) -> None:
+        for name, seconds in timings.items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data["started_at"] = self.started_at.isoformat()
+        return data
+
+
 @dataclass
 class BudgetData:
-    """Snapshot of all accounts and budgets at a point in time."""
+    """Snapshot of all accounts and budgets at a point in time.
+
+    Accounts and budgets are keyed by Actual's stable ids, so renames only
+    change the entry's name. The name indexes resolve a display name to the
+    first matching id.
+
+    ``transactions`` is shared by consecutive snapshots until a refresh
+    replaces it with an updated copy; ``transactions_version`` is its version.
+    ``version`` increases with every new snapshot of the same budget.
+    """
 
     accounts: Dict[str, Account] = field(default_factory=dict)
     budgets: Dict[str, Budget] = field(default_factory=dict)
+    account_ids_by_name: Dict[str, str] = field(default_factory=dict)
+    budget_ids_by_name: Dict[str, str] = field(default_factory=dict)
+    transactions: TransactionIndex | None = field(default=None, compare=False)
+    transactions_version: int | None = None
+    version: int = field(default=0, compare=False)
+
+    def as_dict(self) -> dict:
+        """Compact JSON-safe form for storage, without the transaction index."""
+        return {
+            "accounts": [
+                [account.id, account.name, str(account.balance)]
+                for account in self.accounts.values()
+            ],
+            "budgets": [
+                [
+                    budget.id,
+                    budget.name,
+                    str(budget.accumulated_balance),
+                    budget.budgeted_before,
+                    budget.month_keys.tolist(),
+                    budget.budgeted.tolist(),
+                    budget.spent.tolist(),
+                ]
+                for budget in self.budgets.values()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, stored: dict) -> BudgetData:
+        """Rebuild a snapshot saved with ``as_dict``."""
+        data = cls()
+        for account_id, name, balance in stored["accounts"]:
+            data.accounts[account_id] = Account(account_id, name, Decimal(balance))
+        for (
+            category_id,
+            name,
+            balance,
+            budgeted_before,
+            month_keys,
+            budgeted,
+            spent,
+        ) in stored["budgets"]:
+            budget = Budget(
+                category_id,
+                name,
+                accumulated_balance=Decimal(balance),
+                budgeted_before=budgeted_before,
+                month_keys=array("i", month_keys),
+                budgeted=array("q", budgeted),
+                spent=array("q", spent),
+            )
+            budget.finalize()
+            data.budgets[category_id] = budget
+        data.reindex()
+        return data
+
+    def reindex(self) -> None:
+        """Rebuild the name indexes after accounts or budgets changed."""
+        self.account_ids_by_name = {}
+        for account_id, account in self.accounts.items():
+            self.account_ids_by_name.setdefault(account.name, account_id)
+        self.budget_ids_by_name = {}
+        for category_id, budget in self.budgets.items():
+            self.budget_ids_by_name.setdefault(budget.name, category_id)
 
 
 class ActualBudget:
     """Interface to an Actual Budget server.
 
-    All blocking operations must run in the executor via hass.async_add_executor_job.
+    Blocking operations run on the entry's ``ActualExecutor`` when one is
+    given (bounded, so a hung server can't take over Home Assistant's shared
+    executor), otherwise via hass.async_add_executor_job.
     A reentrant lock serializes access to the Actual session so concurrent
-    refreshes (e.g. poll + manual sync) don't corrupt SQLAlchemy state.
+    refreshes (e.g. poll + manual sync) don't corrupt SQLAlchemy state. Only
+    mutations need it: snapshots are immutable once published, the query
+    action reads the WAL-mode local copy over its own connection, and a poll
+    that finds a bank sync holding the session returns the published
+    snapshot instead of waiting for it.
+
+    The session is kept open for the lifetime of the entry. It is not
+    revalidated before each call: the token is refreshed only when the server
+    rejects it, and a dropped connection discards the session so the next
+    call reconnects, backing off exponentially while the server is down.
+
+    Refreshes are incremental: every sync records the accounts and categories
+    its messages touched, and only those entries are rebuilt on a copy of the
+    previous snapshot. A refresh that pulled no messages returns the previous
+    snapshot unchanged.
+
+    Entries on the same server share a ``ServerConnection`` (login token and
+    HTTP connection pool); without one, a private connection is used. The
+    sync pulls, change checks and bank sync requests of an open session are
+    sent over the aiohttp ``transport`` from the event loop, and only applying
+    the messages takes an executor thread. Opening a session (login, file
+    lookup, download, validation) happens inside actualpy and stays on the
+    blocking client, which is all the config flow's probe needs.
+
+    With ``index_transactions`` the snapshot also carries a
+    ``TransactionIndex``, rebuilt with full refreshes and updated from the
+    touched transactions otherwise.
     """
 
-    def __init__(self, hass, endpoint, password, file, cert, encrypt_password):
+    def __init__(
+        self,
+        hass,
+        endpoint,
+        password,
+        file,
+        cert,
+        encrypt_password,
+        connection: ServerConnection | None = None,
+        history_months: int | None = None,
+        index_transactions: bool = False,
+        executor: ActualExecutor | None = None,
+        transport: AsyncTransport | None = None,
+    ):
         self.hass = hass
+        self.executor = executor
+        self.transport = transport
         self.endpoint = endpoint
         self.password = password
         self.file = file
         self.cert = cert
         self.encrypt_password = encrypt_password
+        self.connection = connection or ServerConnection(
+            ConnectionKey(endpoint, password, cert)
+        )
         self.actual: Actual | None = None
         self.file_id = None
         self.session_started_at = datetime.datetime.now()
+        self.session_stats = SessionStats()
+        self._retry_at: datetime.datetime | None = None
         self._lock = threading.RLock()
+        # Name of the long-running mutation holding self._lock, if any.
+        self._long_mutation: str | None = None
+        self._tracker = ChangeTracker()
+        self._snapshot: BudgetData | None = None
+        self._snapshot_month: int | None = None
+        self._first_month: int | None = None
+        self.history_months = history_months or None
+        self.index_transactions = index_transactions
+        self.warm_start = False
+        self.last_change_count = 0
+        self.refresh_history: Deque[RefreshStats] = deque(maxlen=REFRESH_HISTORY)
+        self._snapshot_version = 0
+        self._data_dir: pathlib.Path | None = None
+        self._read_engine = None
+        self._query_cache: OrderedDict[QueryRequest, dict] = OrderedDict()
+        self._query_cache_version: int | None = None
+        self.query_cache_hits = 0
+        self.last_check_bytes = 0
+
+    async def run_job(self, func, *args):
+        """Run a blocking call on the entry's executor."""
+        if self.executor is None:
+            return await self.hass.async_add_executor_job(func, *args)
+        return await self.executor.run(func, *args)
 
     def _ensure_session(self):
-        """Return a valid Actual session, creating one if needed.
+        """Return the live Actual session, creating one if needed.
 
         Caller must already hold self._lock.
         """
-        now = datetime.datetime.now()
-        if self.actual and self.session_started_at + SESSION_TIMEOUT < now:
-            try:
-                self.actual.__exit__(None, None, None)
-            except Exception as err:
-                _LOGGER.warning("Error closing stale Actual session: %s", err)
-            self.actual = None
-
         if self.actual:
-            try:
-                result = self.actual.validate()
-                if not result.data.validated:
-                    raise RuntimeError("Session not validated")
-            except Exception as err:
-                _LOGGER.warning("Existing Actual session invalid, reconnecting: %s", err)
-                self.actual = None
-
-        if not self.actual:
-            self.actual = self._create_session()
-            self.session_started_at = now
+            self.session_stats.validations_avoided += 1
+            return self.actual.session
 
+        now = datetime.datetime.now()
+        if self._retry_at and now < self._retry_at:
+            raise ConnectionError(
+                f"Actual server unreachable, next reconnect after {self._retry_at:%H:%M:%S}"
+            )
+        try:
+            self.actual = self._create_session()
+        except ConnectionError:
+            self._schedule_reconnect(now)
+            raise
+        if self.session_stats.consecutive_failures or self._retry_at is not None:
+            self.session_stats.reconnects += 1
+        self.session_stats.consecutive_failures = 0
+        self._retry_at = None
+        self.session_started_at = now
         return self.actual.session
 
+    def _call(self, operation):
+        """Run a server operation on the live session.
+
+        Caller must already hold self._lock.
+        """
+        try:
+            return operation()
+        except HTTPError as err:
+            if err.response is None or err.response.status_code not in (401, 403):
+                raise
+            _LOGGER.debug("Actual server rejected the token, logging in again")
+            self.actual._token = self.connection.refresh_token(self.actual._token)
+            self.session_stats.token_refreshes += 1
+            return operation()
+        except ConnectionError:
+            self._close_session()
+            self._schedule_reconnect(datetime.datetime.now())
+            raise
+
+    def _schedule_reconnect(self, now: datetime.datetime) -> None:
+        self.session_stats.consecutive_failures += 1
+        delay = min(
+            RECONNECT_BACKOFF_MIN * 2 ** (self.session_stats.consecutive_failures - 1),
+            RECONNECT_BACKOFF_MAX,
+        )
+        self._retry_at = now + delay
+        _LOGGER.warning(
+            "Lost connection to Actual server, retrying in %s", delay
+        )
+
+    def _close_session(self) -> None:
+        if self.actual is None:
+            return
+        try:
+            self.actual.__exit__(None, None, None)
+        except Exception as err:
+            _LOGGER.warning("Error closing Actual session: %s", err)
+        self.actual = None
+
+    def close(self) -> None:
+        """Close the budget session; the shared connection is left open."""
+        with self._lock:
+            self._close_session()
+
     def _create_session(self) -> Actual:
-        actual = Actual(
+        """Open the budget with the shared token, logging in again once if the
+        server rejects it (e.g. after a password change)."""
+        token = self.connection.token
+        try:
+            return self._open_session()
+        except HTTPError as err:
+            if err.response is None or err.response.status_code not in (401, 403):
+                raise
+        _LOGGER.debug("Actual server rejected the token, logging in again")
+        self.connection.refresh_token(token)
+        self.session_stats.token_refreshes += 1
+        return self._open_session()
+
+    def _open_session(self) -> Actual:
+        actual = TrackedActual(
             base_url=self.endpoint,
             password=self.password,
             cert=self.cert,
             encryption_password=self.encrypt_password,
             file=self.file,
+            tracker=self._tracker,
+            connection=self.connection,
         )
         self.file_id = str(actual._file.file_id)
         actual._data_dir = (
             pathlib.Path(self.hass.config.path("actualbudget")) / f"{self.file_id}"
         )
-        _LOGGER.debug(f"Creating budget file on folder {actual._data_dir}")
+        self._data_dir = actual._data_dir
+        self._read_engine = None
+        # actualpy reopens db.sqlite + metadata.json when both exist and the
+        # group id still matches the server, then only pulls missing messages.
+        self.warm_start = self._check_local_copy(actual._data_dir)
+        if self.warm_start:
+            _LOGGER.debug(f"Reopening budget file on folder {actual._data_dir}")
+        else:
+            _LOGGER.debug(f"Creating budget file on folder {actual._data_dir}")
+        self._tracker.invalidate()
         actual.__enter__()
+        # Persistent for the file: readers on their own connection then
+        # neither wait for nor block the session's writes.
+        actual.session.connection().exec_driver_sql("PRAGMA journal_mode=WAL")
         result = actual.validate()
         if not result.data.validated:
             raise RuntimeError("Session not validated")
         return actual
 
+    @staticmethod
+    def _check_local_copy(data_dir: pathlib.Path) -> bool:
+        """Return True if a previously downloaded budget can be reopened.
+
+        A copy left half-written (e.g. HA stopped during extraction) is removed
+        so actualpy downloads a fresh one instead of failing on every start.
+        """
+        db_path = data_dir / "db.sqlite"
+        metadata_path = data_dir / "metadata.json"
+        if not (db_path.is_file() and metadata_path.is_file()):
+            return False
+        try:
+            json.loads(metadata_path.read_text())
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            try:
+                conn.execute("SELECT count(*) FROM sqlite_master").fetchone()
+                conn.execute("SELECT count(*) FROM messages_clock").fetchone()
+            finally:
+                conn.close()
+        except (OSError, ValueError, sqlite3.DatabaseError) as err:
+            _LOGGER.warning(
+                "Local budget copy in %s is unusable, downloading again: %s",
+                data_dir,
+                err,
+            )
+            for path in (db_path, *wal_files(db_path), metadata_path):
+                path.unlink(missing_ok=True)
+            return False
+        return True
+
     # -- bulk fetch ---------------------------------------------------------
 
     async def fetch_all(self) -> BudgetData:
-        """Fetch all accounts and budgets in a single session lock acquisition."""
-        return await self.hass.async_add_executor_job(self._fetch_all_sync)
+        """Fetch all accounts and budgets in a single session lock acquisition.
 
-    def _fetch_all_sync(self) -> BudgetData:
-        with self._lock:
+        New messages are pulled over the async transport first, so the
+        executor job only applies them.
+        """
+        stats = RefreshStats()
+        pulled = await self._async_pull(stats)
+        return await self.run_job(self._fetch_all_sync, stats, pulled)
+
+    def _fetch_all_sync(
+        self, stats: RefreshStats | None = None, pulled: PulledChanges | None = None
+    ) -> BudgetData:
+        stats = stats or RefreshStats()
+        started = time.perf_counter()
+        try:
+            if not self._acquire_for_refresh():
+                _LOGGER.debug(
+                    "%s in progress, serving the published snapshot", self._long_mutation
+                )
+                stats.mode = "deferred"
+                return self._snapshot
+            try:
+                stats.lock_wait = time.perf_counter() - started
+                with self.connection.metered() as traffic:
+                    try:
+                        return self._refresh(stats, pulled)
+                    finally:
+                        stats.requests += traffic.requests
+                        stats.bytes_received += traffic.bytes_received
+            finally:
+                self._lock.release()
+        except Exception as err:
+            stats.error = f"{type(err).__name__}: {err}"
+            raise
+        finally:
+            stats.total = time.perf_counter() - started + stats.phases.get("pull", 0.0)
+            self.refresh_history.append(stats)
+
+    async def _async_pull(
+        self, stats: RefreshStats | None = None
+    ) -> PulledChanges | None:
+        """Fetch the messages a sync of the open session would apply.
+
+        Returns None without a transport or session, while a long mutation
+        runs, or when the request fails; ``_sync`` then syncs over the
+        blocking client, which owns reconnects and their backoff.
+        """
+        actual = self.actual
+        if self.transport is None or actual is None or self._long_mutation is not None:
+            return None
+        stats = stats or RefreshStats()
+        traffic = Traffic()
+        since = str(actual._client)
+        request = actual.sync_request()
+        try:
+            with stats.phase("pull"):
+                try:
+                    response = await self.transport.sync(actual, request, traffic)
+                except aiohttp.ClientResponseError as err:
+                    if err.status not in (401, 403):
+                        raise
+                    _LOGGER.debug("Actual server rejected the token, logging in again")
+                    token = await self.connection.async_refresh_token(
+                        self.transport, actual._token, traffic
+                    )
+                    if token is None:
+                        return None
+                    actual._token = token
+                    self.session_stats.token_refreshes += 1
+                    response = await self.transport.sync(actual, request, traffic)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            _LOGGER.debug("Async sync request failed: %s", err)
+            return None
+        finally:
+            stats.requests += traffic.requests
+            stats.bytes_received += traffic.bytes_received
+        return PulledChanges(actual, since, response)
+
+    def _sync(self, pulled: PulledChanges | None = None) -> None:
+        """Apply ``pulled`` if the session has not moved on since, else sync.
+
+        Caller must already hold self._lock.
+        """
+        actual = self.actual
+        if (
+            pulled is not None
+            and pulled.actual is actual
+            and pulled.since == str(actual._client)
+        ):
+            actual.apply_sync_response(pulled.response)
+        else:
+            self._call(actual.sync)
+
+    def _acquire_for_refresh(self) -> bool:
+        """Take the session lock, unless a long mutation holds it.
+
+        Returns False instead of waiting when a bank sync holds the lock and a
+        snapshot is already published; the sync refreshes once it is done.
+        """
+        if self._lock.acquire(blocking=False):
+            return True
+        if self._long_mutation is not None and self._snapshot is not None:
+            return False
+        self._lock.acquire()
+        return True
+
+    def _refresh(
+        self, stats: RefreshStats, pulled: PulledChanges | None = None
+    ) -> BudgetData:
+        """Sync and bring the snapshot up to date. Caller holds self._lock."""
+        with stats.phase("session"):
             session = self._ensure_session()
-            today = datetime.date.today()
+        with stats.phase("sync"):
+            self._sync(pulled)
+        today = datetime.date.today()
+        month = month_to_int(today)
+        touched = self._tracker.consume()
+        self.last_change_count = stats.messages = touched.messages
 
-            data = BudgetData()
+        if self._snapshot is None or touched.full or self._snapshot_month != month:
+            data = self._build_snapshot(session, today, stats)
+        elif touched.is_empty():
+            stats.mode = "unchanged"
+            return self._snapshot
+        else:
+            data = self._update_snapshot(session, today, touched, stats)
 
-            for account in get_accounts(session):
-                if account.name is None:
-                    continue
-                data.accounts[account.name] = Account(
-                    name=account.name, balance=account.balance
+        self._snapshot_version += 1
+        data.version = self._snapshot_version
+        self._snapshot = data
+        self._snapshot_month = month
+        return data
+
+    def _build_snapshot(
+        self, session, today: datetime.date, stats: RefreshStats | None = None
+    ) -> BudgetData:
+        stats = stats or RefreshStats()
+        stats.mode = "full"
+        data = BudgetData()
+        with stats.phase("accounts"):
+            rows = aggregate_accounts(session)
+        for row in rows:
+            self._add_account(data, row)
+        aggregates = aggregate_budgets(
+            session, today, history_months=self.history_months
+        )
+        stats.add_timings(aggregates.timings)
+        self._first_month = aggregates.first_month
+        with stats.phase("snapshot"):
+            data.budgets = self._build_budgets(aggregates)
+            data.reindex()
+        stats.rows = {"accounts": len(rows), "budget_months": len(aggregates.rows)}
+        if self.index_transactions:
+            with stats.phase("transactions"):
+                data.transactions = TransactionIndex.build(session)
+            data.transactions_version = data.transactions.version
+            stats.rows["transactions"] = len(data.transactions)
+        return data
+
+    def _update_snapshot(
+        self,
+        session,
+        today: datetime.date,
+        touched: TouchedEntities,
+        stats: RefreshStats | None = None,
+    ) -> BudgetData:
+        """Rebuild only the touched entries on a copy of the current snapshot."""
+        stats = stats or RefreshStats()
+        stats.mode = "incremental"
+        stats.rows = {"accounts": 0, "budget_months": 0}
+        data = BudgetData(
+            accounts=dict(self._snapshot.accounts),
+            budgets=dict(self._snapshot.budgets),
+            transactions=self._snapshot.transactions,
+        )
+
+        if touched.accounts:
+            for account_id in touched.accounts:
+                data.accounts.pop(account_id, None)
+            with stats.phase("accounts"):
+                rows = aggregate_accounts(session, touched.accounts)
+            for row in rows:
+                self._add_account(data, row)
+            stats.rows["accounts"] = len(rows)
+
+        if touched.categories:
+            aggregates = aggregate_budgets(
+                session, today, touched.categories, self.history_months
+            )
+            stats.add_timings(aggregates.timings)
+            if aggregates.first_month != self._first_month:
+                # An earlier month now starts the carryover walk for everyone.
+                return self._build_snapshot(session, today, stats)
+            with stats.phase("snapshot"):
+                for category_id in touched.categories:
+                    data.budgets.pop(category_id, None)
+                data.budgets.update(self._build_budgets(aggregates))
+            stats.rows["budget_months"] = len(aggregates.rows)
+
+        with stats.phase("snapshot"):
+            data.reindex()
+
+        index = data.transactions
+        if index is not None:
+            with stats.phase("transactions"):
+                # A copy: the published index may be read meanwhile.
+                index = data.transactions = index.updated(
+                    session,
+                    touched.transactions,
+                    touched.account_rows,
+                    names=touched.names,
                 )
+            if touched.transactions:
+                stats.rows["transactions"] = len(touched.transactions)
+            data.transactions_version = index.version
+        return data
 
-            budgets_by_name: Dict[str, Budget] = {}
-            for raw in get_budgets(session):
-                if not raw.category:
-                    continue
-                name = str(raw.category.name)
-                if name not in budgets_by_name:
-                    budgets_by_name[name] = Budget(name=name)
-                budgeted = None if not raw.amount else float(raw.amount) / 100
-                spent = float(raw.balance)
-                budgets_by_name[name].months.append(
-                    BudgetMonth(month=str(raw.month), budgeted=budgeted, spent=spent)
+    @staticmethod
+    def _add_account(data: BudgetData, row) -> None:
+        if row.name is None:
+            return
+        data.accounts[row.account_id] = Account(
+            id=row.account_id, name=row.name, balance=cents_to_decimal(row.balance)
+        )
+
+    @staticmethod
+    def _build_budgets(aggregates: BudgetAggregates) -> Dict[str, Budget]:
+        budgets: Dict[str, Budget] = {}
+        # Rows arrive ordered by month, so each category's arrays stay sorted.
+        for row in aggregates.rows:
+            budget = budgets.get(row.category_id)
+            if budget is None:
+                budget = budgets[row.category_id] = Budget(
+                    id=row.category_id, name=row.category_name
                 )
+            budget.append(row.month, row.amount or 0, row.spent)
 
-            for name, budget in budgets_by_name.items():
-                budget.months.sort(key=lambda m: m.month)
-                try:
-                    budget.accumulated_balance = get_accumulated_budgeted_balance(
-                        session, today, name
-                    )
-                except (AttributeError, TypeError):
-                    budget.accumulated_balance = Decimal(0)
+        for category_id, budget in budgets.items():
+            budget.budgeted_before = aggregates.budgeted_before.get(category_id, 0)
+            budget.finalize()
+            budget.accumulated_balance = cents_to_decimal(
+                aggregates.accumulated.get(category_id, 0)
+            )
+        return budgets
 
-            data.budgets = budgets_by_name
-            return data
+    def set_history_months(self, history_months: int | None) -> None:
+        """Change the history window; the next refresh rebuilds the snapshot."""
+        with self._lock:
+            if (history_months or None) != self.history_months:
+                self.history_months = history_months or None
+                self._tracker.invalidate()
+
+    # -- change checks ------------------------------------------------------
+
+    async def has_remote_changes(self) -> bool | None:
+        """Cheaply check whether the server has changes a refresh would pull.
+
+        Returns None without a transport or session, or when the check failed.
+        """
+        actual = self.actual
+        if self.transport is None or actual is None:
+            return None
+        traffic = Traffic()
+        # Any failure is left for the next regular refresh, which owns
+        # reconnects and token refreshes.
+        try:
+            response = await self.transport.sync(actual, actual.sync_request(), traffic)
+        except Exception as err:
+            _LOGGER.debug("Change check failed: %s", err)
+            return None
+        finally:
+            self.last_check_bytes = traffic.bytes_received
+        return len(response.messages) > 0
+
+    # -- on-demand queries -------------------------------------------------
+
+    async def query(self, data: BudgetData, request: QueryRequest) -> dict:
+        """Answer ``request`` for snapshot ``data``, memoized per snapshot.
+
+        Accounts and budgets come straight from the snapshot. Transaction
+        aggregates read the local copy over a separate read-only connection,
+        so they never wait for the session lock held by a running sync.
+        """
+        if self._query_cache_version != data.version:
+            self._query_cache.clear()
+            self._query_cache_version = data.version
+        cached = self._query_cache.get(request)
+        if cached is not None:
+            self._query_cache.move_to_end(request)
+            self.query_cache_hits += 1
+            return cached
+
+        if request.type == QUERY_ACCOUNTS:
+            result = query_accounts(data, request)
+        elif request.type == QUERY_BUDGETS:
+            result = query_budgets(data, request)
+        else:
+            groups = await self.run_job(
+                self._aggregate_transactions_sync, request
+            )
+            result = format_transactions(request, groups)
+
+        if self._query_cache_version == data.version:
+            self._query_cache[request] = result
+            if len(self._query_cache) > QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        return result
+
+    def _aggregate_transactions_sync(self, request: QueryRequest) -> List[TransactionGroup]:
+        with Session(self._read_only_engine()) as session:
+            return aggregate_transactions(
+                session, request.start, request.end, request.group_by
+            )
+
+    def _read_only_engine(self):
+        """Engine over the local copy, opened read-only for every query.
+
+        Connections are not pooled, so a freshly downloaded file is picked up
+        by the next query.
+        """
+        if self._read_engine is None:
+            if self._data_dir is None:
+                raise BudgetNotDownloadedError("Budget file has not been downloaded yet")
+            uri = f"file:{self._data_dir / 'db.sqlite'}?mode=ro"
+            self._read_engine = create_engine(
+                "sqlite://",
+                creator=lambda: sqlite3.connect(uri, uri=True, check_same_thread=False),
+                poolclass=NullPool,
+            )
+        return self._read_engine
 
     # -- sync actions -------------------------------------------------------
 
-    async def run_bank_sync(self) -> None:
-        """Trigger a bank sync on the Actual server and commit."""
-        await self.hass.async_add_executor_job(self._run_bank_sync)
+    async def run_bank_sync(
+        self,
+        account_ids: Collection[str] | None = None,
+        max_parallel: int = DEFAULT_PARALLEL,
+    ) -> List[BankSyncResult]:
+        """Bank sync every linked account, or only ``account_ids``.
+
+        Provider fetches run concurrently, at most ``max_parallel`` at a time,
+        without the session lock; only planning and the import hold it. The
+        imported transactions are committed in one batch, and an account that
+        fails does not stop the others.
+        """
+        linked, skipped = await self.run_job(self._plan_bank_sync, account_ids)
+        actual = self.actual
+        limit = asyncio.Semaphore(max_parallel)
+        configured: Dict[str, asyncio.Future] = {}
 
-    def _run_bank_sync(self) -> None:
+        async def fetch(item: BankSyncAccount) -> None:
+            async with limit:
+                started = time.perf_counter()
+                source = item.source.lower()
+                try:
+                    if source == "gocardless" and not item.requisition_id:
+                        item.result.status = STATUS_FAILED
+                        item.result.error = "Account has no goCardless requisition id"
+                        return
+                    if source not in configured:
+                        configured[source] = asyncio.ensure_future(
+                            self._bank_sync_configured(actual, source)
+                        )
+                    if not await configured[source]:
+                        item.result.error = f"Bank sync with {item.source} is not configured"
+                        return
+                    response = await self._bank_sync_transactions(actual, item)
+                    if isinstance(response, BankSyncErrorDTO):
+                        error = response.data
+                        _LOGGER.warning(
+                            "Bank sync of %s failed: %s", item.result.name, error.reason
+                        )
+                        item.result.status = STATUS_FAILED
+                        item.result.error = f"{error.error_type}: {error.reason}"
+                        return
+                    item.response = response
+                except Exception as err:
+                    _LOGGER.warning("Bank sync of %s failed: %s", item.result.name, err)
+                    item.result.status = STATUS_FAILED
+                    item.result.error = f"{type(err).__name__}: {err}"
+                finally:
+                    item.result.duration = time.perf_counter() - started
+
+        await asyncio.gather(*(fetch(item) for item in linked))
+        if any(item.response is not None for item in linked):
+            await self.run_job(self._import_bank_sync, linked)
+        return [item.result for item in linked] + skipped
+
+    def _plan_bank_sync(
+        self, account_ids: Collection[str] | None
+    ) -> tuple[List[BankSyncAccount], List[BankSyncResult]]:
         with self._lock:
-            self._ensure_session()
-            self.actual.sync()
-            self.actual.run_bank_sync()
-            self.actual.commit()
+            session = self._ensure_session()
+            self._call(self.actual.sync)
+            return plan_bank_sync(session, account_ids)
+
+    async def _bank_sync_configured(self, actual, source: str) -> bool:
+        status = BankSyncStatusDTO.model_validate(
+            await self.transport.bank_sync(
+                actual,
+                Endpoints.BANK_SYNC_STATUS.value.format(bank_sync=source),
+                {},
+                Traffic(),
+            )
+        )
+        return status.data.configured
+
+    async def _bank_sync_transactions(self, actual, item: BankSyncAccount):
+        source = item.source.lower()
+        payload = {
+            "accountId": item.remote_id,
+            "startDate": item.start_date.strftime("%Y-%m-%d"),
+        }
+        if item.requisition_id:
+            payload["requisitionId"] = item.requisition_id
+        return BankSyncResponseDTO.validate_python(
+            await self.transport.bank_sync(
+                actual,
+                Endpoints.BANK_SYNC_TRANSACTIONS.value.format(bank_sync=source),
+                payload,
+                Traffic(),
+            )
+        )
+
+    def _import_bank_sync(self, linked: List[BankSyncAccount]) -> None:
+        """Reconcile the fetched transactions and commit them in one batch."""
+        with self._lock:
+            self._long_mutation = "Bank sync"
+            try:
+                session = self._ensure_session()
+                changed = 0
+                for item in linked:
+                    if item.response is None:
+                        continue
+                    account = session.get(Accounts, item.account_id)
+                    if account is None:
+                        item.result.status = STATUS_FAILED
+                        item.result.error = "Account was deleted"
+                        continue
+                    # A failed account must not leave half its rows behind.
+                    messages = list(session.info.get("messages", ()))
+                    savepoint = session.begin_nested()
+                    try:
+                        transactions = self.actual.import_bank_sync(
+                            account, item.response, item.start_date, item.first_sync
+                        )
+                        session.flush()
+                        messages = list(session.info.get("messages", ()))
+                        savepoint.commit()
+                    except Exception as err:
+                        _LOGGER.warning(
+                            "Importing bank sync of %s failed: %s", item.result.name, err
+                        )
+                        savepoint.rollback()
+                        item.result.status = STATUS_FAILED
+                        item.result.error = f"{type(err).__name__}: {err}"
+                        continue
+                    finally:
+                        # actualpy drops the pending messages whenever a
+                        # savepoint ends, committed or rolled back.
+                        session.info["messages"] = messages
+                    item.result.status = STATUS_IMPORTED
+                    item.result.imported = len(transactions)
+                    changed += len(transactions)
+                if changed:
+                    # Not through _call: the local commit drops the pending
+                    # messages, so only the push may be retried.
+                    self.actual.commit()
+                    # Imported transactions are written locally, not through a sync.
+                    self._tracker.invalidate()
+                else:
+                    session.rollback()
+            finally:
+                self._long_mutation = None
 
     async def run_budget_sync(self) -> None:
         """Pull latest budget file from the server."""
-        await self.hass.async_add_executor_job(self._run_budget_sync)
+        pulled = await self._async_pull()
+        await self.run_job(self._run_budget_sync, pulled)
 
-    def _run_budget_sync(self) -> None:
+    def _run_budget_sync(self, pulled: PulledChanges | None = None) -> None:
         with self._lock:
             self._ensure_session()
-            self.actual.sync()
+            self._sync(pulled)
 
     # -- connection test ----------------------------------------------------
 
-    async def test_connection(self):
-        return await self.hass.async_add_executor_job(self._test_connection_sync)
+    async def probe(self):
+        """Check the configuration without downloading the budget file."""
+        return await self.run_job(self._probe_sync)
 
-    def _test_connection_sync(self):
+    def _probe_sync(self):
+        """Validate login, file id and encryption password with metadata calls.
+
+        Returns an error key for the config flow, or None on success.
+        """
         try:
-            with self._lock:
-                session = self._ensure_session()
-                if not session:
-                    return "failed_file"
+            server = self.connection.ensure_login()
+            matches = [
+                remote
+                for remote in server.list_user_files().data
+                if self.file in (remote.file_id, remote.name, remote.group_id)
+                and remote.deleted == 0
+            ]
+            if len(matches) != 1:
+                return "failed_file"
+            remote = matches[0]
+            if remote.encrypt_key_id:
+                if not self.encrypt_password:
+                    return "failed_encryption"
+                # The key's test message only decrypts with the right password.
+                key = server.user_get_key(remote.file_id).data
+                test = key.meta()
+                decrypt_from_meta(
+                    create_key_buffer(self.encrypt_password, key.salt),
+                    base64.b64decode(test.value),
+                    test.meta,
+                )
         except SSLError:
             return "failed_ssl"
         except ConnectionError:
             return "failed_connection"
         except AuthorizationError:
             return "failed_auth"
-        except (UnknownFileId, InvalidFile, InvalidZipFile):
+        except ActualDecryptionError:
+            return "failed_encryption"
+        except UnknownFileId:
             return "failed_file"
+        except HTTPError as err:
+            _LOGGER.warning("Actual server rejected the configuration check: %s", err)
+            return "failed_unknown"
         return None
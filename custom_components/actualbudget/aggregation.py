@@ -0,0 +1,382 @@
+"""Batched budget aggregation against the local Actual SQLite copy."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import datetime
+import time
+from typing import Collection, Dict, List, Tuple
+
+from actual.database import (
+    Accounts,
+    Categories,
+    CategoryGroups,
+    Payees,
+    ReflectBudgets,
+    Transactions,
+    ZeroBudgets,
+)
+from actual.queries import get_preference
+from sqlalchemy import and_, case, func, null
+from sqlmodel import select
+
+
+@dataclass
+class BudgetRow:
+    """One budget record (category + month) with its spent total, in cents."""
+
+    category_id: str
+    category_name: str
+    month: int
+    amount: int | None
+    spent: int
+
+
+@dataclass
+class BudgetAggregates:
+    """Result of a single aggregation pass over every category."""
+
+    rows: List[BudgetRow] = field(default_factory=list)
+    # Accumulated balance in cents, by category id (expense categories only).
+    accumulated: Dict[str, int] = field(default_factory=dict)
+    # First month (YYYYMM) of the carryover walk, shared by every category.
+    first_month: int | None = None
+    # Cents budgeted before the first returned row, by category id.
+    budgeted_before: Dict[str, int] = field(default_factory=dict)
+    # Seconds spent in SQL ("budget_queries") and the carryover walk.
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class AccountRow:
+    """One open account with its balance, in cents."""
+
+    account_id: str
+    name: str | None
+    balance: int
+
+
+@dataclass
+class TransactionGroup:
+    """Aggregates of the transactions sharing one group key, in cents."""
+
+    key: str | int | None
+    name: str | None
+    count: int
+    total: int
+    spent: int
+    largest: int | None
+
+
+# Group key and display name columns for aggregate_transactions.
+_GROUP_COLUMNS = {
+    "account": (Transactions.acct, Accounts.name),
+    "category": (Transactions.category_id, Categories.name),
+    "payee": (Transactions.payee_id, Payees.name),
+}
+
+
+def month_to_int(date: datetime.date) -> int:
+    return date.year * 100 + date.month
+
+
+def date_to_int(date: datetime.date) -> int:
+    return date.year * 10000 + date.month * 100 + date.day
+
+
+def _next_month(month: int) -> int:
+    if month % 100 == 12:
+        return (month // 100 + 1) * 100 + 1
+    return month + 1
+
+
+def add_months(month: int, delta: int) -> int:
+    index = (month // 100) * 12 + month % 100 - 1 + delta
+    return (index // 12) * 100 + index % 12 + 1
+
+
+def _is_tracking_budget(session) -> bool:
+    budget_type = get_preference(session, "budgetType")
+    return bool(budget_type and budget_type.value in ("report", "tracking"))
+
+
+def aggregate_accounts(
+    session, account_ids: Collection[str] | None = None
+) -> List[AccountRow]:
+    """Return every open account with its balance in one grouped query.
+
+    If ``account_ids`` is given, only those accounts are returned.
+    """
+    query = (
+        select(
+            Accounts.id,
+            Accounts.name,
+            func.coalesce(func.sum(Transactions.amount), 0),
+        )
+        .outerjoin(
+            Transactions,
+            and_(
+                Transactions.acct == Accounts.id,
+                Transactions.is_parent == 0,
+                Transactions.tombstone == 0,
+            ),
+        )
+        .where(func.coalesce(Accounts.tombstone, 0) == 0)
+        .group_by(Accounts.id)
+        .order_by(Accounts.sort_order)
+    )
+    if account_ids is not None:
+        query = query.where(Accounts.id.in_(account_ids))
+    return [
+        AccountRow(account_id=account_id, name=name, balance=balance)
+        for account_id, name, balance in session.exec(query)
+    ]
+
+
+def aggregate_budgets(
+    session,
+    until: datetime.date,
+    category_ids: Collection[str] | None = None,
+    history_months: int | None = None,
+) -> BudgetAggregates:
+    """Compute per-month rows and accumulated balances for every category.
+
+    Mirrors ``actual.budgets.get_budget_history`` (which
+    ``get_accumulated_budgeted_balance`` rebuilds on every call) but issues a
+    fixed number of grouped queries and walks the carryover rules in memory,
+    so the cost no longer scales with the number of categories.
+
+    If ``category_ids`` is given, only those categories are aggregated.
+    The first budget month is always derived from the whole file, so partial
+    results are identical to the matching entries of a full run.
+
+    If ``history_months`` is given, only rows from that many months before
+    ``until`` onwards are returned, plus each category's last two rows before
+    them, so the current and previous month match a run without a window.
+    Earlier budgeted amounts are summed per category instead. Accumulated
+    balances still cover all history.
+    """
+    started = time.perf_counter()
+    tracking = _is_tracking_budget(session)
+    table = ReflectBudgets if tracking else ZeroBudgets
+    until_month = month_to_int(until)
+    window_start = (
+        add_months(until_month, -history_months) if history_months else None
+    )
+
+    spent_query = (
+        select(
+            Transactions.category_id,
+            Transactions.date // 100,
+            func.sum(Transactions.amount),
+        )
+        .where(
+            Transactions.is_parent == 0,
+            Transactions.tombstone == 0,
+            Transactions.category_id.is_not(None),
+        )
+        .group_by(Transactions.category_id, Transactions.date // 100)
+    )
+    if category_ids is not None:
+        spent_query = spent_query.where(Transactions.category_id.in_(category_ids))
+    spent: Dict[Tuple[str, int], int] = {
+        (category_id, month): total
+        for category_id, month, total in session.exec(spent_query)
+    }
+
+    first_budget_month = session.exec(select(func.min(table.month))).one()
+
+    rows_query = (
+        select(
+            table.category_id,
+            Categories.name,
+            table.month,
+            table.amount,
+            table.carryover,
+        )
+        .join(
+            Categories,
+            and_(table.category_id == Categories.id, Categories.tombstone == 0),
+        )
+        .order_by(table.month.asc())
+    )
+    if category_ids is not None:
+        rows_query = rows_query.where(Categories.id.in_(category_ids))
+
+    result = BudgetAggregates()
+    # (amount, carryover) by (category, month): the carryover walk's input.
+    budget_rows: Dict[Tuple[str, int], Tuple[int | None, int | None]] = {}
+    if window_start is not None:
+        # The carryover walk needs every earlier month, but only as tuples.
+        before_query = (
+            select(
+                table.category_id,
+                Categories.name,
+                table.month,
+                table.amount,
+                table.carryover,
+            )
+            .join(
+                Categories,
+                and_(table.category_id == Categories.id, Categories.tombstone == 0),
+            )
+            .where(table.month < window_start)
+            .order_by(table.month.asc())
+        )
+        if category_ids is not None:
+            before_query = before_query.where(Categories.id.in_(category_ids))
+        # Each category's last rows before the window, oldest first.
+        last_before: Dict[str, List[BudgetRow]] = {}
+        for category_id, name, month, amount, carryover in session.exec(before_query):
+            budget_rows.setdefault((category_id, month), (amount, carryover))
+            result.budgeted_before[category_id] = (
+                result.budgeted_before.get(category_id, 0) + (amount or 0)
+            )
+            last = last_before.setdefault(category_id, [])
+            last.append(
+                BudgetRow(
+                    category_id=category_id,
+                    category_name=str(name),
+                    month=month,
+                    amount=amount,
+                    spent=spent.get((category_id, month), 0),
+                )
+            )
+            if len(last) > 2:
+                del last[0]
+        for category_id, last in last_before.items():
+            for row in last:
+                result.budgeted_before[category_id] -= row.amount or 0
+            result.rows.extend(last)
+        rows_query = rows_query.where(table.month >= window_start)
+
+    for category_id, name, month, amount, carryover in session.exec(rows_query):
+        budget_rows.setdefault((category_id, month), (amount, carryover))
+        result.rows.append(
+            BudgetRow(
+                category_id=category_id,
+                category_name=str(name),
+                month=month,
+                amount=amount,
+                spent=spent.get((category_id, month), 0),
+            )
+        )
+
+    expense_query = (
+        select(Categories.id)
+        .join(CategoryGroups, Categories.cat_group == CategoryGroups.id)
+        .where(
+            Categories.tombstone == 0,
+            func.coalesce(CategoryGroups.tombstone, 0) == 0,
+            CategoryGroups.is_income == 0,
+        )
+    )
+    if category_ids is not None:
+        expense_query = expense_query.where(Categories.id.in_(category_ids))
+    expense_ids = session.exec(expense_query).all()
+
+    if tracking:
+        first_month = first_budget_month
+    else:
+        first_positive = session.exec(
+            select(func.min(Transactions.date)).where(Transactions.amount > 0)
+        ).one()
+        first_positive_month = first_positive // 100 if first_positive else None
+        candidates = [m for m in (first_budget_month, first_positive_month) if m]
+        first_month = min(candidates) if candidates else None
+    if first_month is None or first_month > until_month:
+        first_month = until_month
+    result.first_month = first_month
+    walk_started = time.perf_counter()
+    result.timings["budget_queries"] = walk_started - started
+
+    months: List[int] = []
+    month = first_month
+    while month <= until_month:
+        months.append(month)
+        month = _next_month(month)
+
+    for category_id in expense_ids:
+        accumulated = 0
+        carryover = None
+        for month in months:
+            amount, next_carryover = budget_rows.get((category_id, month), (0, 0))
+            balance = (amount or 0) + spent.get((category_id, month), 0)
+            if carryover is None:
+                accumulated = balance
+            elif tracking:
+                accumulated = (accumulated if carryover else 0) + balance
+            else:
+                if not carryover and accumulated < 0:
+                    accumulated = 0
+                accumulated += balance
+            carryover = bool(next_carryover)
+        result.accumulated[category_id] = accumulated
+
+    result.timings["carryover"] = time.perf_counter() - walk_started
+    return result
+
+
+def aggregate_transactions(
+    session,
+    start: datetime.date | None = None,
+    end: datetime.date | None = None,
+    group_by: str | None = None,
+) -> List[TransactionGroup]:
+    """Count and sum live transactions between ``start`` and ``end`` inclusive.
+
+    ``group_by`` is "month", "account", "category", "payee" or None for a
+    single group. ``spent`` and ``largest`` are outflows, as positive cents.
+    """
+    amount = func.coalesce(Transactions.amount, 0)
+    aggregates = (
+        func.count(),
+        func.sum(amount),
+        -func.sum(case((amount < 0, amount), else_=0)),
+        -func.min(case((amount < 0, amount), else_=None)),
+    )
+    if group_by is None:
+        columns = ()
+    elif group_by == "month":
+        columns = (Transactions.date // 100, null())
+    else:
+        columns = _GROUP_COLUMNS[group_by]
+
+    query = (
+        select(*columns, *aggregates)
+        .join(Accounts, Accounts.id == Transactions.acct)
+        .where(
+            Transactions.is_parent == 0,
+            Transactions.tombstone == 0,
+            Transactions.date.is_not(None),
+            func.coalesce(Accounts.tombstone, 0) == 0,
+        )
+    )
+    if group_by == "category":
+        query = query.outerjoin(Categories, Categories.id == Transactions.category_id)
+    elif group_by == "payee":
+        query = query.outerjoin(Payees, Payees.id == Transactions.payee_id)
+    if start is not None:
+        query = query.where(Transactions.date >= date_to_int(start))
+    if end is not None:
+        query = query.where(Transactions.date <= date_to_int(end))
+    if columns:
+        query = query.group_by(columns[0]).order_by(columns[0])
+
+    groups = []
+    for row in session.exec(query):
+        key, name = row[:2] if columns else (None, None)
+        count, total, spent, largest = row[-4:]
+        if not count:
+            continue
+        groups.append(
+            TransactionGroup(
+                key=key,
+                name=name,
+                count=count,
+                total=total or 0,
+                spent=spent or 0,
+                largest=largest,
+            )
+        )
+    return groups
@@ -0,0 +1,113 @@
+"""Per-account bank sync: plan under the session lock, fetch concurrently, import."""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+import datetime
+from typing import Any, Collection, List
+
+from actual.database import Accounts, Transactions
+from actual.utils.conversions import int_to_date
+from sqlalchemy import func
+from sqlmodel import select
+
+# Provider fetches run concurrently up to this many at a time by default.
+DEFAULT_PARALLEL = 3
+MAX_PARALLEL = 10
+# Days fetched for an account without transactions, as actualpy does.
+FIRST_SYNC_DAYS = 90
+
+STATUS_IMPORTED = "imported"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+
+
+@dataclass
+class BankSyncResult:
+    """Outcome of one account; ``duration`` is the provider fetch in seconds."""
+
+    account_id: str
+    name: str | None
+    status: str = STATUS_SKIPPED
+    imported: int = 0
+    duration: float | None = None
+    error: str | None = None
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class BankSyncAccount:
+    """One linked account, carried from the plan through fetch and import."""
+
+    account_id: str
+    # The provider's account id and sync source ("goCardless", "simpleFin").
+    remote_id: str
+    source: str
+    requisition_id: str | None
+    start_date: datetime.date
+    first_sync: bool
+    result: BankSyncResult
+    # Provider response, set once the fetch succeeded.
+    response: Any = field(default=None, repr=False)
+
+
+def plan_bank_sync(
+    session, account_ids: Collection[str] | None = None
+) -> tuple[List[BankSyncAccount], List[BankSyncResult]]:
+    """Select the accounts to sync and the date to fetch each one from.
+
+    Returns the linked accounts and, for explicitly requested accounts that
+    are not linked to a bank, skipped results. Like actualpy, an account
+    resumes from its latest transaction, or fetches ``FIRST_SYNC_DAYS`` and
+    a starting balance when it has none.
+    """
+    query = select(Accounts).where(func.coalesce(Accounts.tombstone, 0) == 0)
+    if account_ids is not None:
+        query = query.where(Accounts.id.in_(list(account_ids)))
+    accounts = session.exec(query.order_by(Accounts.sort_order)).all()
+
+    latest = dict(
+        session.exec(
+            select(Transactions.acct, func.max(Transactions.date))
+            .where(
+                Transactions.acct.in_([account.id for account in accounts]),
+                Transactions.tombstone == 0,
+                Transactions.is_parent == 0,
+                Transactions.date.is_not(None),
+            )
+            .group_by(Transactions.acct)
+        ).all()
+    )
+
+    linked: List[BankSyncAccount] = []
+    skipped: List[BankSyncResult] = []
+    for account in accounts:
+        result = BankSyncResult(account.id, account.name)
+        if not (account.account_id and account.account_sync_source):
+            if account_ids is not None:
+                result.error = "Account is not linked to a bank"
+                skipped.append(result)
+            continue
+        last_date = latest.get(account.id)
+        linked.append(
+            BankSyncAccount(
+                account_id=account.id,
+                remote_id=account.account_id,
+                source=account.account_sync_source,
+                requisition_id=(
+                    account.bank.bank_id
+                    if account.account_sync_source == "goCardless" and account.bank
+                    else None
+                ),
+                start_date=(
+                    int_to_date(last_date)
+                    if last_date
+                    else datetime.date.today() - datetime.timedelta(days=FIRST_SYNC_DAYS)
+                ),
+                first_sync=last_date is None,
+                result=result,
+            )
+        )
+    return linked, skipped
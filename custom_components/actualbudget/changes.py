@@ -0,0 +1,257 @@
+"""Track which local rows each Actual sync touched."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Set
+
+from actual import Actual
+from actual.database import ReflectBudgets, Transactions, ZeroBudgets
+from actual.protobuf_models import HULC_Client, SyncRequest, SyncResponse
+from actual.queries import get_or_create_clock
+import requests
+from sqlmodel import Session, select
+
+from .connection import ServerConnection
+from .download import download_budget_file
+
+# Datasets whose changes can move or hide many categories at once, or switch
+# the budget type. Those invalidate the whole snapshot.
+FULL_REFRESH_DATASETS = {"category_groups", "preferences"}
+
+_BUDGET_TABLES = {"zero_budgets": ZeroBudgets, "reflect_budgets": ReflectBudgets}
+
+# SQLite limits the number of bound parameters per statement; a catch-up
+# sync can touch far more rows than that.
+_ID_CHUNK = 500
+
+
+def _chunks(ids: Iterable[str]) -> Iterator[List[str]]:
+    ids = list(ids)
+    for start in range(0, len(ids), _ID_CHUNK):
+        yield ids[start : start + _ID_CHUNK]
+
+
+@dataclass
+class TouchedEntities:
+    """Rows affected since the last snapshot was built."""
+
+    full: bool = False
+    accounts: Set[str] = field(default_factory=set)
+    categories: Set[str] = field(default_factory=set)
+    transactions: Set[str] = field(default_factory=set)
+    payees: Set[str] = field(default_factory=set)
+    # Account, category or payee rows themselves changed (e.g. a rename).
+    names: bool = False
+    # Accounts whose own row changed, e.g. closed or moved off budget.
+    account_rows: Set[str] = field(default_factory=set)
+    messages: int = 0
+
+    def is_empty(self) -> bool:
+        return not (
+            self.full
+            or self.accounts
+            or self.categories
+            or self.transactions
+            or self.payees
+        )
+
+
+class ChangeTracker:
+    """Accumulates touched entities across syncs until a refresh consumes them."""
+
+    def __init__(self) -> None:
+        self._touched = TouchedEntities(full=True)
+
+    def invalidate(self) -> None:
+        """Force the next refresh to rebuild the snapshot from scratch."""
+        self._touched.full = True
+
+    def count_messages(self, count: int) -> None:
+        self._touched.messages += count
+
+    def consume(self) -> TouchedEntities:
+        touched, self._touched = self._touched, TouchedEntities()
+        return touched
+
+    def record(self, engine, messages: Iterable) -> None:
+        """Resolve the accounts and categories referenced by ``messages``.
+
+        Called both before and after the messages are applied, so rows that
+        move between accounts or categories mark the old and new owner.
+        """
+        rows: Dict[str, Set[str]] = {}
+        for message in messages:
+            if message.dataset in FULL_REFRESH_DATASETS:
+                self._touched.full = True
+                return
+            rows.setdefault(message.dataset, set()).add(message.row)
+        if not rows or engine is None:
+            return
+
+        self._touched.accounts.update(rows.get("accounts", ()))
+        self._touched.account_rows.update(rows.get("accounts", ()))
+        self._touched.categories.update(rows.get("categories", ()))
+        self._touched.payees.update(rows.get("payees", ()))
+        if rows.keys() & {"accounts", "categories", "payees"}:
+            self._touched.names = True
+        with Session(engine) as session:
+            transaction_ids = rows.get("transactions")
+            if transaction_ids:
+                self._touched.transactions.update(transaction_ids)
+                for chunk in _chunks(transaction_ids):
+                    for acct, category_id in session.exec(
+                        select(Transactions.acct, Transactions.category_id).where(
+                            Transactions.id.in_(chunk)
+                        )
+                    ):
+                        if acct:
+                            self._touched.accounts.add(acct)
+                        if category_id:
+                            self._touched.categories.add(category_id)
+            for dataset, table in _BUDGET_TABLES.items():
+                for chunk in _chunks(rows.get(dataset, ())):
+                    self._touched.categories.update(
+                        category_id
+                        for category_id in session.exec(
+                            select(table.category_id).where(table.id.in_(chunk))
+                        )
+                        if category_id
+                    )
+
+
+class TrackedActual(Actual):
+    """Actual client that reports the rows touched by every applied sync.
+
+    With a ``connection`` it authenticates with the shared token and sends
+    every request over the shared HTTP session instead of logging in itself.
+    """
+
+    def __init__(
+        self,
+        *args,
+        tracker: ChangeTracker,
+        connection: ServerConnection | None = None,
+        **kwargs,
+    ) -> None:
+        self.tracker = tracker
+        self.connection = connection
+        self._prefetched_bank_sync = None
+        self._pushing = False
+        if connection is not None:
+            kwargs["token"] = connection.token
+            kwargs["password"] = None
+        super().__init__(*args, **kwargs)
+
+    @property
+    def _requests_session(self) -> requests.Session:
+        if self.connection is not None:
+            return self.connection.http
+        return self._own_requests_session
+
+    @_requests_session.setter
+    def _requests_session(self, value: requests.Session) -> None:
+        # actualpy creates a session per client; it stays unused when shared.
+        self._own_requests_session = value
+
+    def download_budget(self, encryption_password: str | None = None):
+        """Stream a missing local copy to disk, then let actualpy reopen it.
+
+        actualpy would hold the whole archive (and its decrypted copy) in
+        memory; once both files exist it takes the reopen path instead.
+        """
+        local_files = ("db.sqlite", "metadata.json")
+        if self._data_dir and not all(
+            (self._data_dir / name).is_file() for name in local_files
+        ):
+            encryption_password = encryption_password or self._encryption_password
+            self.download_master_encryption_key(encryption_password)
+            encrypt_meta = None
+            if encryption_password is not None and self._file.encrypt_key_id:
+                info = self.get_user_file_info(self._file.file_id)
+                encrypt_meta = info.data.encrypt_meta
+            download_budget_file(self, self._data_dir, encrypt_meta)
+        return super().download_budget(encryption_password)
+
+    def sync_request(self) -> SyncRequest:
+        """The empty request ``sync`` sends to pull messages newer than ours."""
+        request = SyncRequest(
+            {
+                "messages": [],
+                "fileId": self._file.file_id,
+                "groupId": self._file.group_id,
+                "keyId": self._file.encrypt_key_id,
+            }
+        )
+        client = self._client
+        request.set_timestamp(
+            client_id=client.client_id, now=client.ts, initial_count=client.initial_count
+        )
+        return request
+
+    def sync(self) -> List:
+        return self.apply_sync_response(self.sync_sync(self.sync_request()))
+
+    def apply_sync_response(self, response: SyncResponse) -> List:
+        """Apply a response to ``sync_request`` and advance the clock, as ``sync`` does.
+
+        Lets the request be sent elsewhere, e.g. over the async transport.
+        """
+        messages = response.get_messages(self._master_key)
+        changeset = self.apply_changes(messages)
+        if messages:
+            self._client = HULC_Client.from_timestamp(response.messages[-1].timestamp)
+            with Session(self.engine) as session:
+                get_or_create_clock(session, self._client)
+                session.commit()
+        return changeset
+
+    def commit(self) -> None:
+        """Commit like actualpy, retrying only the push after a token refresh.
+
+        The local commit drops the pending messages before they are pushed,
+        so repeating the whole commit would push nothing.
+        """
+        self._pushing = True
+        try:
+            super().commit()
+        finally:
+            self._pushing = False
+
+    def sync_sync(self, request: SyncRequest) -> SyncResponse:
+        try:
+            return super().sync_sync(request)
+        except requests.HTTPError as err:
+            if not (
+                self._pushing
+                and self.connection is not None
+                and err.response is not None
+                and err.response.status_code in (401, 403)
+            ):
+                raise
+        self._token = self.connection.refresh_token(self._token)
+        return super().sync_sync(request)
+
+    def import_bank_sync(self, account, response, start_date, first_sync: bool) -> List:
+        """Reconcile a provider response fetched beforehand into ``account``.
+
+        Reuses actualpy's per-account import, which would otherwise fetch the
+        transactions itself. Returns the created or changed transactions.
+        """
+        self._prefetched_bank_sync = response
+        try:
+            return self._run_bank_sync_account(account, start_date, first_sync)
+        finally:
+            self._prefetched_bank_sync = None
+
+    def bank_sync_transactions(self, *args, **kwargs):
+        if self._prefetched_bank_sync is not None:
+            return self._prefetched_bank_sync
+        return super().bank_sync_transactions(*args, **kwargs)
+
+    def apply_changes(self, messages: List) -> List:
+        self.tracker.record(self.engine, messages)
+        changes = super().apply_changes(messages)
+        self.tracker.record(self.engine, messages)
+        self.tracker.count_messages(len(messages))
+        return changes
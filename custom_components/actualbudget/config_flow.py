@@ -7,10 +7,14 @@ import voluptuous as vol
 from urllib.parse import urlparse
 
 from homeassistant import config_entries
+from homeassistant.core import callback
+from homeassistant.helpers.selector import TextSelector, TextSelectorConfig
 
 from .actualbudget import ActualBudget
+from .connection import ConnectionKey, ConnectionPool
 from .const import (
     DOMAIN,
+    DATA_CONNECTIONS,
     CONFIG_ENDPOINT,
     CONFIG_PASSWORD,
     CONFIG_FILE,
@@ -19,7 +23,19 @@ from .const import (
     CONFIG_ENCRYPT_PASSWORD,
     CONFIG_UNIT,
     CONFIG_PREFIX,
+    CONFIG_MIN_UPDATE_INTERVAL,
+    CONFIG_MAX_UPDATE_INTERVAL,
+    CONFIG_CHANGE_THRESHOLD,
+    CONFIG_CHANGE_CHECK_INTERVAL,
+    CONFIG_HISTORY_MONTHS,
+    CONFIG_TRANSACTION_SENSORS,
+    DEFAULT_MIN_UPDATE_INTERVAL,
+    DEFAULT_MAX_UPDATE_INTERVAL,
+    DEFAULT_CHANGE_THRESHOLD,
+    DEFAULT_CHANGE_CHECK_INTERVAL,
+    DEFAULT_HISTORY_MONTHS,
 )
+from .transactions import parse_transaction_sensors
 
 _LOGGER = logging.getLogger(__name__)
 _LOGGER.setLevel(logging.DEBUG)
@@ -44,6 +60,12 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     VERSION = 1
     CONNECTION_CLASS = config_entries.CONN_CLASS_CLOUD_POLL
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Return the options flow handler."""
+        return OptionsFlowHandler()
+
     async def async_step_user(self, user_input=None):
         """Handle a flow initialized by the user interface."""
         _LOGGER.debug("Starting async_step_user...")
@@ -82,6 +104,85 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             )
 
     async def _test_connection(self, endpoint, password, file, cert, encrypt_password):
-        """Return true if gas station exists."""
-        api = ActualBudget(self.hass, endpoint, password, file, cert, encrypt_password)
-        return await api.test_connection()
+        """Return an error key, or None if the server accepts the configuration.
+
+        Only metadata is fetched; the budget itself is downloaded once, when
+        the entry is set up. A login already shared by other entries is reused.
+        """
+        pool: ConnectionPool | None = self.hass.data.get(DATA_CONNECTIONS)
+        connection = None
+        if pool is not None:
+            connection = pool.acquire(ConnectionKey(endpoint, password, cert))
+        api = ActualBudget(
+            self.hass,
+            endpoint,
+            password,
+            file,
+            cert,
+            encrypt_password,
+            connection=connection,
+        )
+        try:
+            return await api.probe()
+        finally:
+            if pool is not None:
+                await self.hass.async_add_executor_job(pool.release, connection)
+            else:
+                await self.hass.async_add_executor_job(api.connection.close)
+
+
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """actualbudget options flow for the poll scheduler, history window and
+    transaction sensors."""
+
+    async def async_step_init(self, user_input=None):
+        """Manage the scheduler bounds, history window and transaction sensors."""
+        errors = {}
+        if user_input is not None:
+            try:
+                parse_transaction_sensors(user_input.get(CONFIG_TRANSACTION_SENSORS))
+            except ValueError:
+                errors["base"] = "invalid_transaction_sensor"
+            if user_input[CONFIG_MAX_UPDATE_INTERVAL] < user_input[CONFIG_MIN_UPDATE_INTERVAL]:
+                errors["base"] = "invalid_interval"
+            if not errors:
+                return self.async_create_entry(title="", data=user_input)
+
+        options = self.config_entry.options
+        schema = vol.Schema(
+            {
+                vol.Required(
+                    CONFIG_MIN_UPDATE_INTERVAL,
+                    default=options.get(
+                        CONFIG_MIN_UPDATE_INTERVAL, DEFAULT_MIN_UPDATE_INTERVAL
+                    ),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                vol.Required(
+                    CONFIG_MAX_UPDATE_INTERVAL,
+                    default=options.get(
+                        CONFIG_MAX_UPDATE_INTERVAL, DEFAULT_MAX_UPDATE_INTERVAL
+                    ),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                vol.Required(
+                    CONFIG_CHANGE_THRESHOLD,
+                    default=options.get(
+                        CONFIG_CHANGE_THRESHOLD, DEFAULT_CHANGE_THRESHOLD
+                    ),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+                vol.Required(
+                    CONFIG_CHANGE_CHECK_INTERVAL,
+                    default=options.get(
+                        CONFIG_CHANGE_CHECK_INTERVAL, DEFAULT_CHANGE_CHECK_INTERVAL
+                    ),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+                vol.Required(
+                    CONFIG_HISTORY_MONTHS,
+                    default=options.get(CONFIG_HISTORY_MONTHS, DEFAULT_HISTORY_MONTHS),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+                vol.Optional(
+                    CONFIG_TRANSACTION_SENSORS,
+                    default=options.get(CONFIG_TRANSACTION_SENSORS, ""),
+                ): TextSelector(TextSelectorConfig(multiline=True)),
+            }
+        )
+        return self.async_show_form(step_id="init", data_schema=schema, errors=errors)
@@ -0,0 +1,165 @@
+"""Authenticated HTTP connections shared by every budget file on one server."""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import contextmanager
+from dataclasses import dataclass
+import logging
+import threading
+from typing import Dict, Iterator
+
+from actual.api import ActualServer
+import requests
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ConnectionKey:
+    """Identifies one login on one Actual server."""
+
+    endpoint: str
+    password: str
+    cert: str | bool | None
+
+
+@dataclass
+class Traffic:
+    """Requests and response bytes seen while a meter was active."""
+
+    requests: int = 0
+    bytes_received: int = 0
+
+
+class ServerConnection:
+    """One logged-in HTTP session, reused by all files on the same server.
+
+    The token and the underlying connection pool are shared; each file keeps
+    its own Actual client and SQLite session. Thread safe: entries refresh in
+    parallel executor jobs, and the async transport refreshes the token from
+    the event loop.
+    """
+
+    def __init__(self, key: ConnectionKey) -> None:
+        self.key = key
+        self.logins = 0
+        self._lock = threading.Lock()
+        self._server: ActualServer | None = None
+        self._meters = threading.local()
+        self._async_login = asyncio.Lock()
+
+    @property
+    def http(self) -> requests.Session:
+        return self.ensure_login()._requests_session
+
+    @property
+    def token(self) -> str:
+        return self.ensure_login()._token
+
+    def ensure_login(self) -> ActualServer:
+        """Log in on first use and return the shared server client."""
+        with self._lock:
+            if self._server is None:
+                _LOGGER.debug("Logging in to Actual server %s", self.key.endpoint)
+                self._server = ActualServer(
+                    base_url=self.key.endpoint,
+                    password=self.key.password,
+                    cert=self.key.cert,
+                )
+                self._server._requests_session.hooks["response"].append(
+                    self._meter_response
+                )
+                self.logins += 1
+            return self._server
+
+    def refresh_token(self, rejected_token: str | None) -> str:
+        """Return a valid token after the server rejected ``rejected_token``.
+
+        Only the first caller to report a given token logs in again; the
+        others pick up the token it obtained.
+        """
+        server = self.ensure_login()
+        with self._lock:
+            if server._token == rejected_token:
+                server.login(self.key.password)
+                server._requests_session.headers.update(server.headers())
+                self.logins += 1
+            return server._token
+
+    async def async_refresh_token(
+        self, transport, rejected_token: str | None, traffic: Traffic
+    ) -> str | None:
+        """``refresh_token`` for the event loop, logging in over ``transport``.
+
+        Returns None before the first (blocking) login.
+        """
+        async with self._async_login:
+            server = self._server
+            if server is None:
+                return None
+            if server._token != rejected_token:
+                return server._token
+            token = await transport.login(self.key.password, traffic)
+            with self._lock:
+                server._token = token
+                server._requests_session.headers.update(server.headers())
+                self.logins += 1
+            return token
+
+    @contextmanager
+    def metered(self) -> Iterator[Traffic]:
+        """Count the responses received by the calling thread.
+
+        The session is shared between entries, so traffic is attributed to
+        whichever entry's executor job made the request.
+        """
+        traffic = Traffic()
+        previous = getattr(self._meters, "traffic", None)
+        self._meters.traffic = traffic
+        try:
+            yield traffic
+        finally:
+            self._meters.traffic = previous
+
+    def _meter_response(self, response: requests.Response, *args, **kwargs) -> None:
+        traffic = getattr(self._meters, "traffic", None)
+        if traffic is not None:
+            traffic.requests += 1
+            traffic.bytes_received += int(response.headers.get("Content-Length") or 0)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._server is not None:
+                self._server._requests_session.close()
+                self._server = None
+
+
+class ConnectionPool:
+    """Reference-counted ``ServerConnection`` registry, keyed by login."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._connections: Dict[ConnectionKey, ServerConnection] = {}
+        self._users: Dict[ConnectionKey, int] = {}
+
+    def acquire(self, key: ConnectionKey) -> ServerConnection:
+        with self._lock:
+            connection = self._connections.get(key)
+            if connection is None:
+                connection = self._connections[key] = ServerConnection(key)
+            self._users[key] = self._users.get(key, 0) + 1
+            return connection
+
+    def release(self, connection: ServerConnection) -> None:
+        """Drop one user; the connection is closed when the last one leaves."""
+        with self._lock:
+            key = connection.key
+            remaining = self._users.get(key, 0) - 1
+            if remaining > 0:
+                self._users[key] = remaining
+                return
+            self._users.pop(key, None)
+            if self._connections.get(key) is connection:
+                del self._connections[key]
+        connection.close()
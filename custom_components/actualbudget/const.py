@@ -1,6 +1,7 @@
 DOMAIN = "actualbudget"
 PLATFORM = "sensor"
 DOMAIN_DATA = f"{DOMAIN}_data"
+DATA_CONNECTIONS = f"{DOMAIN}_connections"
 
 DEFAULT_ICON = "mdi:bank"
 
@@ -13,3 +14,15 @@ CONFIG_CERT = "cert"
 CONFIG_SKIP_VALIDATE_CERT = "skip_validate_cert"
 CONFIG_ENCRYPT_PASSWORD = "encrypt_password"
 ATTR_CONFIG_ENTRY_ID = "config_entry_id"
+
+CONFIG_MIN_UPDATE_INTERVAL = "min_update_interval"
+CONFIG_MAX_UPDATE_INTERVAL = "max_update_interval"
+CONFIG_CHANGE_THRESHOLD = "change_threshold"
+CONFIG_HISTORY_MONTHS = "history_months"
+CONFIG_TRANSACTION_SENSORS = "transaction_sensors"
+CONFIG_CHANGE_CHECK_INTERVAL = "change_check_interval"
+DEFAULT_MIN_UPDATE_INTERVAL = 5  # minutes
+DEFAULT_MAX_UPDATE_INTERVAL = 60  # minutes
+DEFAULT_CHANGE_THRESHOLD = 0  # sync messages
+DEFAULT_HISTORY_MONTHS = 0  # months, 0 keeps all history
+DEFAULT_CHANGE_CHECK_INTERVAL = 30  # seconds, 0 disables
@@ -2,44 +2,308 @@
 
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime, timedelta, timezone
 import logging
+import time
+from typing import Dict, Hashable, Set
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 
-from .actualbudget import ActualBudget, BudgetData
+from .actualbudget import ActualBudget, BudgetData, RefreshStats
+from .const import (
+    DEFAULT_CHANGE_THRESHOLD,
+    DEFAULT_MAX_UPDATE_INTERVAL,
+    DEFAULT_MIN_UPDATE_INTERVAL,
+)
+from .executor import ExecutorBusyError
 
 _LOGGER = logging.getLogger(__name__)
 
-UPDATE_INTERVAL = timedelta(minutes=60)
+# Growth factors applied to the update interval after a quiet or failed poll.
+IDLE_BACKOFF_FACTOR = 2
+FAILURE_BACKOFF_FACTOR = 4
+
+STORAGE_VERSION = 1
+# Seconds a new snapshot waits before it is written, so that a burst of
+# refreshes causes a single write.
+SNAPSHOT_SAVE_DELAY = 60
+
+
+def account_context(account_id: str) -> tuple:
+    """Listener context for the sensor of account ``account_id``."""
+    return ("account", account_id)
+
+
+def budget_context(category_id: str) -> tuple:
+    """Listener context for the sensor of budget category ``category_id``."""
+    return ("budget", category_id)
+
+
+def transactions_context() -> tuple:
+    """Listener context shared by the transaction aggregate sensors."""
+    return ("transactions", None)
+
+
+def changed_contexts(old: BudgetData | None, new: BudgetData) -> Set[Hashable] | None:
+    """Return the listener contexts whose entry differs between two snapshots.
+
+    Returns None when every listener must be notified.
+    """
+    if old is None:
+        return None
+    if old is new:
+        return set()
+    changed: Set[Hashable] = set()
+    for account_id in old.accounts.keys() | new.accounts.keys():
+        before, after = old.accounts.get(account_id), new.accounts.get(account_id)
+        if before is not after and before != after:
+            changed.add(account_context(account_id))
+    for category_id in old.budgets.keys() | new.budgets.keys():
+        before, after = old.budgets.get(category_id), new.budgets.get(category_id)
+        if before is not after and before != after:
+            changed.add(budget_context(category_id))
+    if (
+        old.transactions is not new.transactions
+        or old.transactions_version != new.transactions_version
+    ):
+        changed.add(transactions_context())
+    return changed
 
 
 class ActualBudgetCoordinator(DataUpdateCoordinator[BudgetData]):
-    """Single source of truth for all ActualBudget sensor data."""
+    """Single source of truth for all ActualBudget sensor data.
+
+    Listeners registered with a context (account and budget sensors) are only
+    notified when their entry changed in the new snapshot; listeners without a
+    context, like the last-sync sensor, are notified on every update.
+
+    The poll interval adapts between ``min_interval`` and ``max_interval``:
+    it drops to the minimum when a refresh pulled more than
+    ``change_threshold`` sync messages, doubles after a quiet refresh and
+    quadruples after a failed one.
 
-    def __init__(self, hass: HomeAssistant, api: ActualBudget) -> None:
+    Between polls, an optional change check asks the server every
+    ``change_check_interval`` whether anything newer than the last applied
+    message exists, and requests a refresh as soon as it does.
+
+    With a ``store``, every new snapshot is saved, and ``async_restore``
+    publishes the saved one at startup so entities have values before the
+    server answered. Refreshes that fail before the first successful one
+    keep serving it rather than making every entity unavailable.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        api: ActualBudget,
+        min_interval: timedelta = timedelta(minutes=DEFAULT_MIN_UPDATE_INTERVAL),
+        max_interval: timedelta = timedelta(minutes=DEFAULT_MAX_UPDATE_INTERVAL),
+        change_threshold: int = DEFAULT_CHANGE_THRESHOLD,
+        store: Store | None = None,
+    ) -> None:
         super().__init__(
             hass,
             _LOGGER,
             name="ActualBudget",
-            update_interval=UPDATE_INTERVAL,
+            update_interval=min_interval,
         )
         self.api = api
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.change_threshold = change_threshold
         self.last_refresh: datetime | None = None
         self.syncing: bool = False
+        self.sync_tasks: Dict[Hashable, asyncio.Task] = {}
+        self.syncs_coalesced: int = 0
+        self.entities_notified: int = 0
+        self.entities_skipped: int = 0
+        self._pending_contexts: Set[Hashable] | None = None
+        self._notified_success: bool | None = None
+        self._data_month: int | None = None
+        self._data_day: int | None = None
+        self._pending_stats: RefreshStats | None = None
+        self.change_checks: int = 0
+        self.changes_detected: int = 0
+        self._checking = False
+        self._unsub_change_checks: CALLBACK_TYPE | None = None
+        self._store = store
+        self._saved_version: int | None = None
+        self.restored: bool = False
+        self._serving_restored = False
+
+    def set_interval_bounds(
+        self, min_interval: timedelta, max_interval: timedelta, change_threshold: int
+    ) -> None:
+        """Apply new scheduler bounds; takes effect from the next poll."""
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.change_threshold = change_threshold
+        self.update_interval = min_interval
+
+    @callback
+    def set_change_check_interval(self, interval: timedelta | None) -> None:
+        """Start, restart or (with None) stop the change checks."""
+        if self._unsub_change_checks is not None:
+            self._unsub_change_checks()
+            self._unsub_change_checks = None
+        if interval:
+            self._unsub_change_checks = async_track_time_interval(
+                self.hass,
+                self._async_check_changes,
+                interval,
+                name="ActualBudget change check",
+                cancel_on_shutdown=True,
+            )
+
+    async def _async_check_changes(self, _now: datetime | None = None) -> None:
+        """Request a refresh if the server has messages we have not applied."""
+        if self._checking or self.sync_tasks or not self.last_update_success:
+            # A sync refreshes on its own; a failing server is left to the
+            # backed-off poll.
+            return
+        self._checking = True
+        try:
+            changed = await self.api.has_remote_changes()
+        except ExecutorBusyError:
+            _LOGGER.debug("Skipping change check, executor is busy")
+            return
+        finally:
+            self._checking = False
+        self.change_checks += 1
+        if changed:
+            self.changes_detected += 1
+            _LOGGER.debug("Actual server has new changes, refreshing")
+            await self.async_request_refresh()
+
+    def _adapt_interval(self, changes: int | None) -> None:
+        """Pick the next poll interval from the outcome of this refresh.
+
+        ``changes`` is the number of sync messages pulled, or None on failure.
+        """
+        current = self.update_interval or self.min_interval
+        if changes is None:
+            interval = current * FAILURE_BACKOFF_FACTOR
+        elif changes > self.change_threshold:
+            interval = self.min_interval
+        else:
+            interval = current * IDLE_BACKOFF_FACTOR
+        self.update_interval = max(self.min_interval, min(interval, self.max_interval))
 
     def set_syncing(self, value: bool) -> None:
         """Update the syncing flag and push to listeners immediately."""
         if self.syncing == value:
             return
         self.syncing = value
+        self._pending_contexts = set()
         self.async_update_listeners()
 
+    @callback
+    def async_update_listeners(self) -> None:
+        """Notify only the listeners whose data changed since the last update."""
+        contexts, self._pending_contexts = self._pending_contexts, None
+        if self._notified_success != self.last_update_success:
+            # Availability changed: every entity has to write its state.
+            contexts = None
+        self._notified_success = self.last_update_success
+
+        started = time.perf_counter()
+        listeners = list(self._listeners.values())
+        to_notify = [
+            update_callback
+            for update_callback, context in listeners
+            if contexts is None or context is None or context in contexts
+        ]
+        self.entities_notified = len(to_notify)
+        self.entities_skipped = len(listeners) - len(to_notify)
+        for update_callback in to_notify:
+            update_callback()
+
+        stats = self._pending_stats
+        if stats is not None:
+            self._pending_stats = None
+            stats.notify = time.perf_counter() - started
+            stats.entities_notified = len(to_notify)
+
+    async def async_restore(self) -> bool:
+        """Publish the snapshot saved by the previous run, if there is one.
+
+        The transaction index is not saved; transaction sensors stay
+        unavailable until the first refresh.
+        """
+        if self._store is None:
+            return False
+        stored = await self._store.async_load()
+        if not stored:
+            return False
+        try:
+            data = BudgetData.from_dict(stored["snapshot"])
+            last_refresh = stored.get("last_refresh")
+            last_refresh = datetime.fromisoformat(last_refresh) if last_refresh else None
+        except (KeyError, TypeError, ValueError, ArithmeticError) as err:
+            _LOGGER.warning("Ignoring unreadable saved ActualBudget snapshot: %s", err)
+            return False
+        self.last_refresh = last_refresh
+        if last_refresh is not None:
+            # Lets the first refresh notify only the entities that changed.
+            saved_at = last_refresh.astimezone()
+            self._data_month = saved_at.year * 100 + saved_at.month
+            self._data_day = saved_at.day
+        self.restored = self._serving_restored = True
+        self.async_set_updated_data(data)
+        return True
+
+    @callback
+    def _data_to_store(self) -> dict:
+        return {
+            "last_refresh": self.last_refresh.isoformat() if self.last_refresh else None,
+            "snapshot": self.data.as_dict(),
+        }
+
+    @property
+    def last_refresh_stats(self) -> RefreshStats | None:
+        history = self.api.refresh_history
+        return history[-1] if history else None
+
     async def _async_update_data(self) -> BudgetData:
+        started = time.perf_counter()
         try:
             data = await self.api.fetch_all()
         except Exception as err:
+            self._adapt_interval(None)
+            if self._serving_restored:
+                _LOGGER.warning(
+                    "Actual server unavailable, keeping the saved snapshot: %s", err
+                )
+                self._pending_contexts = set()
+                return self.data
             raise UpdateFailed(f"Error fetching ActualBudget data: {err}") from err
-        self.last_refresh = datetime.now(timezone.utc)
+        finally:
+            self._pending_stats = self.last_refresh_stats
+            if self._pending_stats is not None:
+                self._pending_stats.update_total = time.perf_counter() - started
+        self._serving_restored = False
+        stats = self.last_refresh_stats
+        if stats is None or stats.mode != "deferred":
+            # A deferred refresh pulled nothing; its change count is stale.
+            self._adapt_interval(self.api.last_change_count)
+            self.last_refresh = datetime.now(timezone.utc)
+        now = datetime.now()
+        month = now.year * 100 + now.month
+        if month != self._data_month:
+            # Budget attributes follow the current month even if data didn't change.
+            self._pending_contexts = None
+        else:
+            self._pending_contexts = changed_contexts(self.data, data)
+            if now.day != self._data_day and self._pending_contexts is not None:
+                # Day aggregates start over at midnight.
+                self._pending_contexts.add(transactions_context())
+        self._data_month = month
+        self._data_day = now.day
+        if self._store is not None and data.version != self._saved_version:
+            self._saved_version = data.version
+            self._store.async_delay_save(self._data_to_store, SNAPSHOT_SAVE_DELAY)
         return data
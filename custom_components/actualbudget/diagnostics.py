@@ -0,0 +1,63 @@
+"""Diagnostics support for the ActualBudget integration."""
+
+from __future__ import annotations
+
+from dataclasses import asdict
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .actualbudget import ActualBudget
+from .const import CONFIG_ENCRYPT_PASSWORD, CONFIG_PASSWORD, DOMAIN
+from .coordinator import ActualBudgetCoordinator
+
+TO_REDACT = {CONFIG_PASSWORD, CONFIG_ENCRYPT_PASSWORD}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return the session state and recent refresh timings of an entry."""
+    entry_data = hass.data[DOMAIN][entry.entry_id]
+    api: ActualBudget = entry_data["api"]
+    coordinator: ActualBudgetCoordinator = entry_data["coordinator"]
+    snapshot = coordinator.data
+
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "coordinator": {
+            "last_update_success": coordinator.last_update_success,
+            "last_refresh": coordinator.last_refresh,
+            "update_interval": (
+                coordinator.update_interval.total_seconds()
+                if coordinator.update_interval
+                else None
+            ),
+            "syncing": coordinator.syncing,
+            "restored": coordinator.restored,
+            "syncs_coalesced": coordinator.syncs_coalesced,
+            "entities_notified": coordinator.entities_notified,
+            "entities_skipped": coordinator.entities_skipped,
+            "change_checks": coordinator.change_checks,
+            "changes_detected": coordinator.changes_detected,
+            "last_check_bytes": api.last_check_bytes,
+        },
+        "session": {
+            "started_at": api.session_started_at,
+            "warm_start": api.warm_start,
+            "history_months": api.history_months,
+            "stats": asdict(api.session_stats),
+            "logins": api.connection.logins,
+        },
+        "executor": api.executor.stats.as_dict() if api.executor else None,
+        "snapshot": {
+            "accounts": len(snapshot.accounts) if snapshot else None,
+            "budgets": len(snapshot.budgets) if snapshot else None,
+        },
+        "refresh_history": [stats.as_dict() for stats in api.refresh_history],
+    }
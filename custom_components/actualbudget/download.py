@@ -0,0 +1,135 @@
+"""Stream a budget file from the Actual server to disk with bounded memory."""
+
+from __future__ import annotations
+
+import base64
+import json
+import logging
+import os
+import pathlib
+import shutil
+import zipfile
+
+from actual.api.models import Endpoints
+from actual.exceptions import ActualDecryptionError, InvalidZipFile
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from requests.exceptions import ChunkedEncodingError, ConnectionError, Timeout
+
+_LOGGER = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+MAX_ATTEMPTS = 5
+# Seconds to wait for the connection and between received chunks.
+DOWNLOAD_TIMEOUT = (30, 60)
+
+_ARCHIVE = "download.zip.part"
+_DECRYPTED = "download.zip"
+_STAGING = "download"
+_BUDGET_FILES = ("db.sqlite", "metadata.json")
+
+
+def wal_files(db_path: pathlib.Path) -> tuple[pathlib.Path, pathlib.Path]:
+    """The write-ahead log files SQLite keeps next to ``db_path``."""
+    return (
+        db_path.with_name(db_path.name + "-wal"),
+        db_path.with_name(db_path.name + "-shm"),
+    )
+
+
+def download_budget_file(actual, data_dir: pathlib.Path, encrypt_meta=None) -> None:
+    """Download, decrypt and extract ``actual``'s file into ``data_dir``.
+
+    The archive is streamed to a temporary file, resuming with a range request
+    when the connection drops, then decrypted and extracted chunk by chunk.
+    ``db.sqlite`` and ``metadata.json`` are moved into place only once both
+    are complete, metadata last, so an interrupted download never looks like
+    a usable local copy.
+    """
+    data_dir.mkdir(parents=True, exist_ok=True)
+    archive = data_dir / _ARCHIVE
+    staging = data_dir / _STAGING
+    try:
+        _fetch(actual, archive)
+        if encrypt_meta is not None:
+            decrypted = data_dir / _DECRYPTED
+            _decrypt(actual._master_key, archive, decrypted, encrypt_meta)
+            archive.unlink()
+            archive = decrypted
+
+        shutil.rmtree(staging, ignore_errors=True)
+        try:
+            with zipfile.ZipFile(archive) as zip_file:
+                for name in _BUDGET_FILES:
+                    zip_file.extract(name, staging)
+        except (zipfile.BadZipFile, KeyError) as err:
+            raise InvalidZipFile(f"Invalid zip file: {err}") from None
+
+        # Downloaded budgets do not always carry the group id actualpy checks
+        # before reusing a local copy.
+        metadata_path = staging / "metadata.json"
+        metadata = json.loads(metadata_path.read_text())
+        metadata["groupId"] = actual._file.group_id
+        metadata_path.write_text(json.dumps(metadata, separators=(",", ":")))
+
+        (data_dir / "metadata.json").unlink(missing_ok=True)
+        # A log left by the previous copy must not be replayed onto this one.
+        for path in wal_files(data_dir / "db.sqlite"):
+            path.unlink(missing_ok=True)
+        for name in _BUDGET_FILES:
+            os.replace(staging / name, data_dir / name)
+    finally:
+        (data_dir / _ARCHIVE).unlink(missing_ok=True)
+        (data_dir / _DECRYPTED).unlink(missing_ok=True)
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def _fetch(actual, target: pathlib.Path) -> None:
+    """Stream the remote archive into ``target``, resuming after drops."""
+    url = f"{actual.api_url}/{Endpoints.DOWNLOAD_USER_FILE}"
+    target.unlink(missing_ok=True)
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        offset = target.stat().st_size if target.exists() else 0
+        headers = actual.headers(actual._file.file_id)
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        try:
+            with actual._requests_session.get(
+                url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT
+            ) as response:
+                response.raise_for_status()
+                # A server that ignores the range sends the whole file again.
+                mode = "ab" if offset and response.status_code == 206 else "wb"
+                with target.open(mode) as handle:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        handle.write(chunk)
+            return
+        except (ChunkedEncodingError, ConnectionError, Timeout) as err:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            _LOGGER.warning(
+                "Budget download interrupted after %s bytes, resuming: %s",
+                target.stat().st_size if target.exists() else 0,
+                err,
+            )
+
+
+def _decrypt(
+    master_key: bytes, source: pathlib.Path, target: pathlib.Path, encrypt_meta
+) -> None:
+    """AES-GCM decrypt ``source`` into ``target`` one chunk at a time."""
+    decryptor = Cipher(
+        algorithms.AES(master_key),
+        modes.GCM(
+            base64.b64decode(encrypt_meta.iv), base64.b64decode(encrypt_meta.auth_tag)
+        ),
+    ).decryptor()
+    with source.open("rb") as reader, target.open("wb") as writer:
+        while chunk := reader.read(CHUNK_SIZE):
+            writer.write(decryptor.update(chunk))
+        try:
+            writer.write(decryptor.finalize())
+        except InvalidTag:
+            raise ActualDecryptionError(
+                "Error decrypting file. Is the encryption key correct?"
+            ) from None
@@ -0,0 +1,128 @@
+"""Bounded thread pool for the integration's blocking Actual work."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import logging
+import time
+from typing import Any, Callable, Deque, Dict, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+# A refresh, a sync, a query and a change check can be in flight at once;
+# the session lock serializes the mutations among them anyway.
+MAX_WORKERS = 3
+# Jobs queued or running before new ones are rejected.
+MAX_PENDING = 8
+# Number of finished jobs kept for diagnostics.
+JOB_HISTORY = 50
+
+
+class ExecutorBusyError(RuntimeError):
+    """Raised when a job is submitted to a full or shut down executor."""
+
+
+@dataclass
+class ExecutorStats:
+    """Counters and recent timings of one ``ActualExecutor``."""
+
+    submitted: int = 0
+    rejected: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    pending: int = 0
+    max_pending: int = 0
+    # (job name, seconds queued, seconds running) of recent jobs.
+    recent: Deque[Tuple[str, float, float]] = field(
+        default_factory=lambda: deque(maxlen=JOB_HISTORY)
+    )
+
+    def as_dict(self) -> Dict[str, Any]:
+        waits = sorted(wait for _, wait, _ in self.recent)
+        return {
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "queue_wait_max": waits[-1] if waits else None,
+            "recent": [
+                {"job": name, "queue_wait": wait, "run": run}
+                for name, wait, run in self.recent
+            ],
+        }
+
+
+class ActualExecutor:
+    """Runs one entry's blocking Actual calls on its own named threads.
+
+    Keeps slow servers from holding Home Assistant's shared executor threads.
+    At most ``max_pending`` jobs may be queued or running; more are rejected
+    with ``ExecutorBusyError`` rather than piling up behind the session lock.
+    ``shutdown`` cancels queued jobs; running ones finish in the background.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int = MAX_WORKERS,
+        max_pending: int = MAX_PENDING,
+    ) -> None:
+        self.name = name
+        self.max_pending = max_pending
+        self.stats = ExecutorStats()
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix=name)
+        self._shut_down = False
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run ``func(*args)`` on the pool and return its result.
+
+        Must be called from the event loop, which owns the counters.
+        """
+        stats = self.stats
+        if self._shut_down:
+            raise ExecutorBusyError(f"{self.name} is shut down")
+        if stats.pending >= self.max_pending:
+            stats.rejected += 1
+            raise ExecutorBusyError(
+                f"{self.name} already has {stats.pending} jobs pending"
+            )
+
+        submitted = time.perf_counter()
+        timing: Dict[str, float] = {}
+
+        def job() -> Any:
+            started = time.perf_counter()
+            timing["wait"] = started - submitted
+            try:
+                return func(*args)
+            finally:
+                timing["run"] = time.perf_counter() - started
+
+        stats.submitted += 1
+        stats.pending += 1
+        stats.max_pending = max(stats.max_pending, stats.pending)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, job)
+        except asyncio.CancelledError:
+            stats.cancelled += 1
+            raise
+        except Exception:
+            stats.failed += 1
+            raise
+        finally:
+            stats.pending -= 1
+            if "run" in timing:
+                stats.recent.append(
+                    (getattr(func, "__name__", repr(func)), timing["wait"], timing["run"])
+                )
+
+    def shutdown(self) -> None:
+        """Reject new jobs and cancel queued ones without waiting."""
+        self._shut_down = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        _LOGGER.debug("%s shut down", self.name)
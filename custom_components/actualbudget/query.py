@@ -0,0 +1,96 @@
+"""On-demand queries answered from the snapshot or the local budget copy."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import datetime
+from typing import Any, Dict, List
+
+from .aggregation import TransactionGroup, month_to_int
+
+QUERY_ACCOUNTS = "accounts"
+QUERY_BUDGETS = "budgets"
+QUERY_TRANSACTIONS = "transactions"
+QUERY_TYPES = (QUERY_ACCOUNTS, QUERY_BUDGETS, QUERY_TRANSACTIONS)
+GROUP_BY = ("month", "account", "category", "payee")
+
+
+@dataclass(frozen=True)
+class QueryRequest:
+    """Parameters of one ``actualbudget.query`` call; hashable for memoization.
+
+    ``start`` and ``end`` are inclusive. Budgets are filtered by month,
+    transactions by day; account balances are always current. ``name``
+    restricts accounts or budgets to one entry.
+    """
+
+    type: str
+    start: datetime.date | None = None
+    end: datetime.date | None = None
+    group_by: str | None = None
+    name: str | None = None
+
+
+def _cents(value: int | None) -> float | None:
+    return None if value is None else value / 100
+
+
+def query_accounts(data, request: QueryRequest) -> Dict[str, Any]:
+    return {
+        "accounts": [
+            {"id": account.id, "name": account.name, "balance": float(account.balance)}
+            for account in data.accounts.values()
+            if request.name is None or account.name == request.name
+        ]
+    }
+
+
+def query_budgets(data, request: QueryRequest) -> Dict[str, Any]:
+    start = month_to_int(request.start) if request.start else None
+    end = month_to_int(request.end) if request.end else None
+    budgets: List[Dict[str, Any]] = []
+    for budget in data.budgets.values():
+        if request.name is not None and budget.name != request.name:
+            continue
+        months = []
+        for index, month in enumerate(budget.month_keys):
+            if (start is not None and month < start) or (end is not None and month > end):
+                continue
+            months.append(
+                {
+                    "month": str(month),
+                    "budgeted": _cents(budget.budgeted[index]),
+                    "spent": _cents(budget.spent[index]),
+                    "total_budgeted": _cents(budget.running_budgeted[index]),
+                }
+            )
+        budgets.append(
+            {
+                "id": budget.id,
+                "name": budget.name,
+                "balance": float(round(budget.accumulated_balance, 2)),
+                "months": months,
+            }
+        )
+    return {"budgets": budgets}
+
+
+def format_transactions(
+    request: QueryRequest, groups: List[TransactionGroup]
+) -> Dict[str, Any]:
+    return {
+        "start": request.start.isoformat() if request.start else None,
+        "end": request.end.isoformat() if request.end else None,
+        "group_by": request.group_by,
+        "groups": [
+            {
+                "key": str(group.key) if group.key is not None else None,
+                "name": group.name,
+                "count": group.count,
+                "total": _cents(group.total),
+                "spent": _cents(group.spent),
+                "largest": _cents(group.largest),
+            }
+            for group in groups
+        ],
+    }
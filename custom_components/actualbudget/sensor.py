@@ -7,14 +7,23 @@ import logging
 from typing import Dict, Union
 
 from homeassistant.components.sensor import SensorEntity
-from homeassistant.components.sensor.const import SensorDeviceClass
+from homeassistant.components.sensor.const import SensorDeviceClass, SensorStateClass
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import EntityCategory, UnitOfInformation, UnitOfTime
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.util import slugify
 
 from .const import CONFIG_PREFIX, CONFIG_UNIT, DEFAULT_ICON, DOMAIN
-from .coordinator import ActualBudgetCoordinator
+from .coordinator import (
+    ActualBudgetCoordinator,
+    account_context,
+    budget_context,
+    transactions_context,
+)
+from .transactions import TransactionQuery
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -24,31 +33,89 @@ async def async_setup_entry(
     config_entry: ConfigEntry,
     async_add_entities: AddEntitiesCallback,
 ) -> None:
-    """Set up sensors from a config entry."""
+    """Set up sensors from a config entry.
+
+    Accounts and categories that appear in later refreshes get their sensors
+    added on the fly; sensors whose entry disappeared report unavailable.
+    """
     entry_data = hass.data[DOMAIN][config_entry.entry_id]
     coordinator: ActualBudgetCoordinator = entry_data["coordinator"]
     unique_source_id: str = entry_data["unique_source_id"]
     unit = config_entry.data.get(CONFIG_UNIT, "€")
     prefix = config_entry.data.get(CONFIG_PREFIX)
 
-    entities: list[SensorEntity] = [
-        ActualBudgetLastSyncSensor(coordinator, unique_source_id, prefix),
-    ]
-    data = coordinator.data
-    if data is not None:
-        for name in data.accounts:
+    known_accounts: set[str] = set()
+    known_budgets: set[str] = set()
+
+    @callback
+    def _async_add_new_entities() -> None:
+        data = coordinator.data
+        if data is None:
+            return
+        entities: list[SensorEntity] = []
+        for account_id, account in data.accounts.items():
+            if account_id in known_accounts:
+                continue
             entities.append(
-                ActualBudgetAccountSensor(coordinator, name, unit, unique_source_id, prefix)
+                ActualBudgetAccountSensor(
+                    coordinator, account_id, account.name, unit, unique_source_id, prefix
+                )
             )
-        for name in data.budgets:
+        for category_id, budget in data.budgets.items():
+            if category_id in known_budgets:
+                continue
             entities.append(
-                ActualBudgetBudgetSensor(coordinator, name, unit, unique_source_id, prefix)
+                ActualBudgetBudgetSensor(
+                    coordinator, category_id, budget.name, unit, unique_source_id, prefix
+                )
             )
-    async_add_entities(entities)
+        if not entities:
+            return
+        known_accounts.update(data.accounts)
+        known_budgets.update(data.budgets)
+        for entity in entities:
+            _migrate_unique_id(hass, entity.legacy_unique_id, entity.unique_id)
+        async_add_entities(entities)
+
+    async_add_entities(
+        [
+            ActualBudgetLastSyncSensor(coordinator, unique_source_id, prefix),
+            ActualBudgetRefreshDurationSensor(coordinator, unique_source_id, prefix),
+            ActualBudgetRefreshTrafficSensor(coordinator, unique_source_id, prefix),
+        ]
+    )
+    queries = {str(query): query for query in entry_data["transaction_sensors"]}
+    async_add_entities(
+        ActualBudgetTransactionSensor(coordinator, query, unit, unique_source_id, prefix)
+        for query in queries.values()
+    )
+    _async_add_new_entities()
+    config_entry.async_on_unload(coordinator.async_add_listener(_async_add_new_entities))
+
+
+@callback
+def _migrate_unique_id(hass: HomeAssistant, old_unique_id: str, new_unique_id: str) -> None:
+    """Move a name-based registry entry to the id-based unique_id.
+
+    Keeps the entity_id, history and customizations of sensors created
+    before entities were keyed by Actual ids.
+    """
+    registry = er.async_get(hass)
+    entity_id = registry.async_get_entity_id("sensor", DOMAIN, old_unique_id)
+    if entity_id is None:
+        return
+    if registry.async_get_entity_id("sensor", DOMAIN, new_unique_id) is not None:
+        return
+    _LOGGER.debug("Migrating %s unique_id to %s", entity_id, new_unique_id)
+    registry.async_update_entity(entity_id, new_unique_id=new_unique_id)
 
 
 class ActualBudgetAccountSensor(CoordinatorEntity[ActualBudgetCoordinator], SensorEntity):
-    """Account balance sensor backed by the coordinator snapshot."""
+    """Account balance sensor backed by the coordinator snapshot.
+
+    Keyed by the account's Actual id, so renaming the account only changes
+    the sensor's name.
+    """
 
     _attr_device_class = SensorDeviceClass.MONETARY
     _attr_icon = DEFAULT_ICON
@@ -56,49 +123,63 @@ class ActualBudgetAccountSensor(CoordinatorEntity[ActualBudgetCoordinator], Sens
     def __init__(
         self,
         coordinator: ActualBudgetCoordinator,
+        account_id: str,
         account_name: str,
         unit: str,
         unique_source_id: str,
         prefix: str | None,
     ) -> None:
-        super().__init__(coordinator)
+        super().__init__(coordinator, account_context(account_id))
+        self._account_id = account_id
         self._account_name = account_name
         self._prefix = prefix
         self._attr_native_unit_of_measurement = unit
         self._attr_unit_of_measurement = unit
-        self._attr_name = (
-            f"{prefix}_{account_name}" if prefix else account_name
-        )
         if prefix:
             self._attr_unique_id = (
+                f"{DOMAIN}-{unique_source_id}-{prefix}-account-{account_id}".lower()
+            )
+            self.legacy_unique_id = (
                 f"{DOMAIN}-{unique_source_id}-{prefix}-{account_name}".lower()
             )
         else:
             self._attr_unique_id = (
+                f"{DOMAIN}-{unique_source_id}-account-{account_id}".lower()
+            )
+            self.legacy_unique_id = (
                 f"{DOMAIN}-{unique_source_id}-{account_name}".lower()
             )
 
+    @property
+    def name(self) -> str:
+        account = self._current_account()
+        name = account.name if account is not None else self._account_name
+        return f"{self._prefix}_{name}" if self._prefix else name
+
     @property
     def available(self) -> bool:
-        return (
-            super().available
-            and self.coordinator.data is not None
-            and self._account_name in self.coordinator.data.accounts
-        )
+        return super().available and self._current_account() is not None
 
     @property
     def native_value(self) -> float | None:
-        data = self.coordinator.data
-        if data is None:
-            return None
-        account = data.accounts.get(self._account_name)
+        account = self._current_account()
         if account is None:
             return None
         return float(account.balance)
 
+    def _current_account(self):
+        data = self.coordinator.data
+        if data is None:
+            return None
+        return data.accounts.get(self._account_id)
+
 
 class ActualBudgetBudgetSensor(CoordinatorEntity[ActualBudgetCoordinator], SensorEntity):
-    """Budget category balance sensor backed by the coordinator snapshot."""
+    """Budget category balance sensor backed by the coordinator snapshot.
+
+    Keyed by the category's Actual id, so renaming the category only changes
+    the sensor's name.
+    """
 
     _attr_device_class = SensorDeviceClass.MONETARY
     _attr_icon = DEFAULT_ICON
@@ -106,34 +187,44 @@ class ActualBudgetBudgetSensor(CoordinatorEntity[ActualBudgetCoordinator], Senso
     def __init__(
         self,
         coordinator: ActualBudgetCoordinator,
+        category_id: str,
         category_name: str,
         unit: str,
         unique_source_id: str,
         prefix: str | None,
     ) -> None:
-        super().__init__(coordinator)
+        super().__init__(coordinator, budget_context(category_id))
+        self._category_id = category_id
         self._category_name = category_name
         self._prefix = prefix
+        self._attrs_cache: tuple = (None, None, {})
         self._attr_native_unit_of_measurement = unit
         self._attr_unit_of_measurement = unit
-        base = f"budget_{category_name}"
-        self._attr_name = f"{prefix}_{base}" if prefix else base
         if prefix:
             self._attr_unique_id = (
+                f"{DOMAIN}-{unique_source_id}-{prefix}-budget-{category_id}".lower()
+            )
+            self.legacy_unique_id = (
                 f"{DOMAIN}-{unique_source_id}-{prefix}-budget-{category_name}".lower()
             )
         else:
             self._attr_unique_id = (
+                f"{DOMAIN}-{unique_source_id}-budget-{category_id}".lower()
+            )
+            self.legacy_unique_id = (
                 f"{DOMAIN}-{unique_source_id}-budget-{category_name}".lower()
             )
 
+    @property
+    def name(self) -> str:
+        budget = self._current_budget()
+        name = budget.name if budget is not None else self._category_name
+        base = f"budget_{name}"
+        return f"{self._prefix}_{base}" if self._prefix else base
+
     @property
     def available(self) -> bool:
-        return (
-            super().available
-            and self.coordinator.data is not None
-            and self._category_name in self.coordinator.data.budgets
-        )
+        return super().available and self._current_budget() is not None
 
     @property
     def native_value(self) -> float | None:
@@ -148,34 +239,103 @@ class ActualBudgetBudgetSensor(CoordinatorEntity[ActualBudgetCoordinator], Senso
         if budget is None:
             return {}
         now = datetime.datetime.now()
-        months = [
-            m
-            for m in budget.months
-            if datetime.datetime.strptime(m.month, "%Y%m") <= now
-        ]
-        if not months:
+        month_key = now.year * 100 + now.month
+        cached_budget, cached_key, cached_attrs = self._attrs_cache
+        if cached_budget is budget and cached_key == month_key:
+            return cached_attrs
+        attrs = self._build_attributes(budget, month_key)
+        self._attrs_cache = (budget, month_key, attrs)
+        return attrs
+
+    @staticmethod
+    def _build_attributes(budget, month_key: int) -> Dict[str, Union[str, float, None]]:
+        index = budget.month_index(month_key)
+        if index < 0:
             return {}
-        current = months[-1]
+        current = budget.month(index)
         attrs: Dict[str, Union[str, float, None]] = {
             "current_month": current.month,
             "current_budgeted": current.budgeted,
             "current_amount": current.budgeted,  # backward compat
             "current_spent": current.spent,
         }
-        if len(months) > 1:
-            previous = months[-2]
+        if index > 0:
+            previous = budget.month(index - 1)
             attrs["previous_month"] = previous.month
             attrs["previous_budgeted"] = previous.budgeted
             attrs["previous_amount"] = previous.budgeted  # backward compat
             attrs["previous_spent"] = previous.spent
-            attrs["total_amount"] = sum(m.budgeted or 0 for m in months)  # backward compat
+            attrs["total_amount"] = budget.total_budgeted(index)  # backward compat
         return attrs
 
     def _current_budget(self):
         data = self.coordinator.data
         if data is None:
             return None
-        return data.budgets.get(self._category_name)
+        return data.budgets.get(self._category_id)
+
+
+class ActualBudgetTransactionSensor(
+    CoordinatorEntity[ActualBudgetCoordinator], SensorEntity
+):
+    """Aggregate over transactions, configured in the entry's options.
+
+    Answered from the snapshot's transaction index, so refreshes never run
+    per-sensor SQL.
+    """
+
+    _attr_icon = "mdi:receipt-text"
+
+    def __init__(
+        self,
+        coordinator: ActualBudgetCoordinator,
+        query: TransactionQuery,
+        unit: str,
+        unique_source_id: str,
+        prefix: str | None,
+    ) -> None:
+        super().__init__(coordinator, transactions_context())
+        self._query = query
+        if query.is_amount:
+            self._attr_device_class = SensorDeviceClass.MONETARY
+            self._attr_native_unit_of_measurement = unit
+        else:
+            self._attr_state_class = SensorStateClass.MEASUREMENT
+        base_name = f"transactions_{slugify(str(query))}"
+        self._attr_name = f"{prefix}_{base_name}" if prefix else base_name
+        slug = slugify(str(query)).replace("_", "-")
+        if prefix:
+            self._attr_unique_id = (
+                f"{DOMAIN}-{unique_source_id}-{prefix}-transactions-{slug}".lower()
+            )
+        else:
+            self._attr_unique_id = (
+                f"{DOMAIN}-{unique_source_id}-transactions-{slug}".lower()
+            )
+
+    @property
+    def available(self) -> bool:
+        data = self.coordinator.data
+        return super().available and data is not None and data.transactions is not None
+
+    @property
+    def native_value(self) -> float | int | None:
+        data = self.coordinator.data
+        if data is None or data.transactions is None:
+            return None
+        value = data.transactions.query(self._query, datetime.date.today())
+        if value is None or not self._query.is_amount:
+            return value
+        return value / 100
+
+    @property
+    def extra_state_attributes(self) -> Dict[str, Union[str, float, None]]:
+        return {
+            "metric": self._query.metric,
+            "period": self._query.period,
+            "filter": self._query.dimension,
+            "name": self._query.name,
+        }
 
 
 class ActualBudgetLastSyncSensor(CoordinatorEntity[ActualBudgetCoordinator], SensorEntity):
@@ -213,8 +373,126 @@ class ActualBudgetLastSyncSensor(CoordinatorEntity[ActualBudgetCoordinator], Sen
 
     @property
     def extra_state_attributes(self) -> Dict[str, Union[str, float, bool, None]]:
-        return {"syncing": self.coordinator.syncing}
+        return {
+            "syncing": self.coordinator.syncing,
+            "entities_notified": self.coordinator.entities_notified,
+            "entities_skipped": self.coordinator.entities_skipped,
+            "syncs_coalesced": self.coordinator.syncs_coalesced,
+            "change_checks": self.coordinator.change_checks,
+            "changes_detected": self.coordinator.changes_detected,
+        }
 
     @property
     def available(self) -> bool:
         return True
+
+
+def _percentile(values: list[float], fraction: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+class _ActualBudgetRefreshSensor(CoordinatorEntity[ActualBudgetCoordinator], SensorEntity):
+    """Base for the diagnostic sensors describing the latest refresh.
+
+    Disabled by default; the recent history is also part of the entry's
+    diagnostics download.
+    """
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _base_name: str
+
+    def __init__(
+        self,
+        coordinator: ActualBudgetCoordinator,
+        unique_source_id: str,
+        prefix: str | None,
+    ) -> None:
+        super().__init__(coordinator)
+        self._attr_name = f"{prefix}_{self._base_name}" if prefix else self._base_name
+        slug = self._base_name.replace("_", "-")
+        if prefix:
+            self._attr_unique_id = (
+                f"{DOMAIN}-{unique_source_id}-{prefix}-{slug}".lower()
+            )
+        else:
+            self._attr_unique_id = f"{DOMAIN}-{unique_source_id}-{slug}".lower()
+
+    @property
+    def available(self) -> bool:
+        return self.coordinator.last_refresh_stats is not None
+
+
+class ActualBudgetRefreshDurationSensor(_ActualBudgetRefreshSensor):
+    """Duration of the latest refresh, with a per-phase breakdown."""
+
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_icon = "mdi:timer-outline"
+    _base_name = "refresh_duration"
+
+    @property
+    def native_value(self) -> float | None:
+        stats = self.coordinator.last_refresh_stats
+        if stats is None:
+            return None
+        return round(stats.total * 1000, 1)
+
+    @property
+    def extra_state_attributes(self) -> Dict[str, Union[str, float, int, None]]:
+        stats = self.coordinator.last_refresh_stats
+        if stats is None:
+            return {}
+        attrs: Dict[str, Union[str, float, int, None]] = {
+            "mode": stats.mode,
+            "error": stats.error,
+            "lock_wait_ms": round(stats.lock_wait * 1000, 1),
+        }
+        for name, seconds in stats.phases.items():
+            attrs[f"{name}_ms"] = round(seconds * 1000, 1)
+        if stats.update_total is not None:
+            attrs["update_ms"] = round(stats.update_total * 1000, 1)
+        if stats.notify is not None:
+            attrs["notify_ms"] = round(stats.notify * 1000, 1)
+            attrs["entities_notified"] = stats.entities_notified
+        for name, count in stats.rows.items():
+            attrs[f"{name}_rows"] = count
+        attrs["messages"] = stats.messages
+        totals = [entry.total * 1000 for entry in self.coordinator.api.refresh_history]
+        attrs["history_size"] = len(totals)
+        attrs["history_p50_ms"] = round(_percentile(totals, 0.5), 1)
+        attrs["history_p95_ms"] = round(_percentile(totals, 0.95), 1)
+        return attrs
+
+
+class ActualBudgetRefreshTrafficSensor(_ActualBudgetRefreshSensor):
+    """Response bytes received from the Actual server by the latest refresh."""
+
+    _attr_device_class = SensorDeviceClass.DATA_SIZE
+    _attr_native_unit_of_measurement = UnitOfInformation.BYTES
+    _attr_icon = "mdi:swap-vertical"
+    _base_name = "refresh_traffic"
+
+    @property
+    def native_value(self) -> int | None:
+        stats = self.coordinator.last_refresh_stats
+        if stats is None:
+            return None
+        return stats.bytes_received
+
+    @property
+    def extra_state_attributes(self) -> Dict[str, Union[str, float, int, None]]:
+        stats = self.coordinator.last_refresh_stats
+        if stats is None:
+            return {}
+        history = self.coordinator.api.refresh_history
+        return {
+            "requests": stats.requests,
+            "history_size": len(history),
+            "history_requests": sum(entry.requests for entry in history),
+            "history_bytes_received": sum(entry.bytes_received for entry in history),
+        }
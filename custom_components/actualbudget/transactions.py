@@ -0,0 +1,399 @@
+"""In-memory transaction index, bucketed by month, account, category and payee."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import datetime
+import sys
+from typing import Callable, Collection, Dict, Iterable, List, Tuple
+
+from actual.database import Accounts, Categories, Payees, Transactions
+from sqlalchemy import and_, func
+from sqlmodel import select
+
+from .aggregation import date_to_int
+
+DIMENSIONS = ("account", "category", "payee")
+PERIODS = ("day", "month", "all")
+# count: number of transactions; total: net amount; spent: sum of outflows;
+# largest: largest single outflow. Amounts are in cents, outflows positive.
+METRICS = ("count", "total", "spent", "largest")
+UNCATEGORIZED = "uncategorized"
+
+# SQLite limits the number of bound parameters per statement.
+_ID_CHUNK = 500
+
+# (dimension, key); ("all", None) holds every transaction.
+BucketKey = Tuple[str, str | None]
+_ALL: BucketKey = ("all", None)
+
+
+@dataclass(slots=True)
+class IndexedTransaction:
+    id: str
+    date: int  # YYYYMMDD
+    account_id: str
+    category_id: str | None
+    payee_id: str | None
+    amount: int  # cents
+    transfer: bool
+    offbudget: bool
+    # Buckets the transaction counts in, computed once.
+    keys: Tuple[BucketKey, ...] = field(init=False)
+
+    def __post_init__(self) -> None:
+        keys: List[BucketKey] = [
+            _ALL,
+            ("account", self.account_id),
+            ("payee", self.payee_id),
+        ]
+        # Transfers and off-budget transactions have no category without
+        # being uncategorized.
+        if not (self.transfer or self.offbudget):
+            keys.append(("category", self.category_id))
+        self.keys = tuple(keys)
+
+
+@dataclass(slots=True)
+class Bucket:
+    """Running totals of a set of transactions, maintained on add/remove."""
+
+    count: int = 0
+    total: int = 0
+    spent: int = 0
+    # Largest outflow, recomputed lazily after a removal.
+    _largest: int | None = None
+    _largest_valid: bool = True
+
+    def add(self, entry: IndexedTransaction) -> None:
+        self.count += 1
+        self.total += entry.amount
+        if entry.amount < 0:
+            self.spent -= entry.amount
+            if self._largest_valid and (
+                self._largest is None or -entry.amount > self._largest
+            ):
+                self._largest = -entry.amount
+
+    def remove(self, entry: IndexedTransaction) -> None:
+        self.count -= 1
+        self.total -= entry.amount
+        if entry.amount < 0:
+            self.spent += entry.amount
+            if self._largest == -entry.amount:
+                self._largest_valid = False
+
+    def copy(self) -> Bucket:
+        # Read the flag first: a concurrent largest() only ever stores the
+        # value and then marks it valid.
+        valid = self._largest_valid
+        return Bucket(self.count, self.total, self.spent, self._largest, valid)
+
+    def largest(
+        self, members: Callable[[], Iterable[IndexedTransaction]]
+    ) -> int | None:
+        """Largest outflow; ``members`` lists the bucket's transactions."""
+        if not self._largest_valid:
+            self._largest = max(
+                (-entry.amount for entry in members() if entry.amount < 0),
+                default=None,
+            )
+            self._largest_valid = True
+        return self._largest
+
+
+@dataclass(frozen=True)
+class TransactionQuery:
+    """One aggregate over the index, e.g. ``spent month payee=Groceries``.
+
+    ``dimension`` None covers every transaction; ``category`` with ``name``
+    None selects uncategorized transactions.
+    """
+
+    metric: str
+    period: str
+    dimension: str | None = None
+    name: str | None = None
+
+    @classmethod
+    def parse(cls, spec: str) -> TransactionQuery:
+        """Parse ``<metric> <period> [uncategorized | <dimension>=<name>]``."""
+        parts = spec.strip().split(maxsplit=2)
+        if len(parts) < 2 or parts[0] not in METRICS or parts[1] not in PERIODS:
+            raise ValueError(f"Invalid transaction sensor: {spec!r}")
+        metric, period = parts[0], parts[1]
+        if len(parts) == 2:
+            return cls(metric, period)
+        selector = parts[2].strip()
+        if selector == UNCATEGORIZED:
+            return cls(metric, period, "category")
+        dimension, _, name = selector.partition("=")
+        dimension, name = dimension.strip(), name.strip()
+        if dimension not in DIMENSIONS or not name:
+            raise ValueError(f"Invalid transaction sensor filter: {selector!r}")
+        return cls(metric, period, dimension, name)
+
+    def __str__(self) -> str:
+        spec = f"{self.metric} {self.period}"
+        if self.dimension is None:
+            return spec
+        if self.name is None:
+            return f"{spec} {UNCATEGORIZED}"
+        return f"{spec} {self.dimension}={self.name}"
+
+    @property
+    def is_amount(self) -> bool:
+        return self.metric != "count"
+
+
+def parse_transaction_sensors(text: str | None) -> List[TransactionQuery]:
+    """Parse the options text: one query per non-empty line."""
+    return [
+        TransactionQuery.parse(line) for line in (text or "").splitlines() if line.strip()
+    ]
+
+
+class TransactionIndex:
+    """Every live transaction, with running totals per month and key.
+
+    Month buckets keep running totals for all transactions and for each
+    account, category and payee. A month query reads one bucket and an
+    all-time query one bucket per month. Transaction ids are only kept per
+    month, so day queries, and ``largest`` after a removal, scan a single
+    month.
+
+    An index is never modified once built: a refresh builds an updated copy
+    in the executor while sensors keep reading the published one on the event
+    loop. The copy shares every bucket it does not touch. ``version`` changes
+    whenever the contents do.
+    """
+
+    def __init__(self) -> None:
+        self.entries: Dict[str, IndexedTransaction] = {}
+        self.version = 0
+        self._months: Dict[BucketKey, Dict[int, Bucket]] = {}
+        self._month_ids: Dict[int, set] = {}
+        self._names: Dict[str, Dict[str, str]] = {}
+        # ids of the containers this index created and may still modify;
+        # the others are shared with the index it was copied from.
+        self._owned: set = set()
+
+    @classmethod
+    def build(cls, session) -> TransactionIndex:
+        index = cls()
+        for row in session.exec(_transactions_query()):
+            index._add(_entry(row))
+        index._names = _load_names(session)
+        index._owned = set()
+        return index
+
+    def updated(
+        self,
+        session,
+        transaction_ids: Collection[str] = (),
+        account_ids: Collection[str] = (),
+        names: bool = False,
+    ) -> TransactionIndex:
+        """Return a copy with the given transactions reloaded from the session.
+
+        Every transaction of ``account_ids`` is reloaded too, for accounts
+        that were deleted, closed, reopened or moved on or off budget. With
+        ``names`` the account, category and payee names are reloaded after
+        renames. Returns this index if nothing changed.
+        """
+        ids = set(transaction_ids)
+        rows = {}
+        for column, keys in (
+            (Transactions.id, list(ids)),
+            (Transactions.acct, list(account_ids)),
+        ):
+            for start in range(0, len(keys), _ID_CHUNK):
+                chunk = keys[start : start + _ID_CHUNK]
+                for row in session.exec(_transactions_query().where(column.in_(chunk))):
+                    rows[row[0]] = row
+        new_names = _load_names(session) if names else self._names
+        if not (ids or rows or account_ids or new_names != self._names):
+            return self
+
+        index = TransactionIndex()
+        index.entries = dict(self.entries)
+        index._months = dict(self._months)
+        index._month_ids = dict(self._month_ids)
+        index._names = new_names
+        index.version = self.version + 1
+        if account_ids:
+            ids.update(
+                entry.id
+                for entry in self.entries.values()
+                if entry.account_id in account_ids
+            )
+        for transaction_id in ids | rows.keys():
+            entry = index.entries.get(transaction_id)
+            if entry is not None:
+                index._remove(entry)
+        for row in rows.values():
+            index._add(_entry(row))
+        index._owned = set()
+        return index
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def query(self, query: TransactionQuery, today: datetime.date) -> int | None:
+        """Answer ``query``; amounts are in cents.
+
+        Returns None when the named account, category or payee is unknown, or
+        for ``largest`` when there is no outflow.
+        """
+        if query.dimension is None:
+            key = _ALL
+        elif query.name is None:
+            key = (query.dimension, None)
+        else:
+            key_id = self._names.get(query.dimension, {}).get(query.name.casefold())
+            if key_id is None:
+                return None
+            key = (query.dimension, key_id)
+
+        month = today.year * 100 + today.month
+        if query.period == "day":
+            date = date_to_int(today)
+            day = Bucket()
+            for entry in self._members(key, month):
+                if entry.date == date:
+                    day.add(entry)
+            return self._metric(query.metric, day, key, month)
+
+        months = self._months.get(key, {})
+        if query.period == "month":
+            bucket = months.get(month) or Bucket()
+            return self._metric(query.metric, bucket, key, month)
+
+        if query.metric == "largest":
+            return max(
+                (
+                    largest
+                    for bucket_month, bucket in months.items()
+                    if (largest := self._metric("largest", bucket, key, bucket_month))
+                    is not None
+                ),
+                default=None,
+            )
+        return sum(getattr(bucket, query.metric) for bucket in months.values())
+
+    def _members(self, key: BucketKey, month: int) -> Iterable[IndexedTransaction]:
+        for transaction_id in self._month_ids.get(month, ()):
+            entry = self.entries[transaction_id]
+            if key == _ALL or key in entry.keys:
+                yield entry
+
+    def _metric(self, metric: str, bucket: Bucket, key: BucketKey, month: int):
+        if metric == "largest":
+            return bucket.largest(lambda: self._members(key, month))
+        return getattr(bucket, metric)
+
+    def _writable(self, container, copy):
+        """``container``, or a copy owned by this index if it is shared."""
+        if id(container) in self._owned:
+            return container
+        container = copy(container)
+        self._owned.add(id(container))
+        return container
+
+    def _add(self, entry: IndexedTransaction) -> None:
+        self.entries[entry.id] = entry
+        month = entry.date // 100
+        for key in entry.keys:
+            months = self._months[key] = self._writable(
+                self._months.get(key, {}), dict
+            )
+            bucket = months[month] = self._writable(
+                months.get(month) or Bucket(), Bucket.copy
+            )
+            bucket.add(entry)
+        ids = self._month_ids[month] = self._writable(
+            self._month_ids.get(month, set()), set
+        )
+        ids.add(entry.id)
+
+    def _remove(self, entry: IndexedTransaction) -> None:
+        month = entry.date // 100
+        for key in entry.keys:
+            months = self._months[key] = self._writable(self._months[key], dict)
+            bucket = months[month] = self._writable(months[month], Bucket.copy)
+            bucket.remove(entry)
+            if not bucket.count:
+                del months[month]
+                if not months:
+                    del self._months[key]
+        ids = self._month_ids[month] = self._writable(self._month_ids[month], set)
+        ids.discard(entry.id)
+        if not ids:
+            del self._month_ids[month]
+        del self.entries[entry.id]
+
+
+def _transactions_query():
+    return (
+        select(
+            Transactions.id,
+            Transactions.date,
+            Transactions.acct,
+            Transactions.category_id,
+            Transactions.payee_id,
+            func.coalesce(Transactions.amount, 0),
+            Transactions.transferred_id,
+            Accounts.offbudget,
+        )
+        .join(Accounts, Accounts.id == Transactions.acct)
+        .where(
+            and_(
+                Transactions.is_parent == 0,
+                Transactions.tombstone == 0,
+                Transactions.date.is_not(None),
+                func.coalesce(Accounts.tombstone, 0) == 0,
+                func.coalesce(Accounts.closed, 0) == 0,
+            )
+        )
+    )
+
+
+def _entry(row) -> IndexedTransaction:
+    (
+        transaction_id,
+        date,
+        account_id,
+        category_id,
+        payee_id,
+        amount,
+        transfer,
+        offbudget,
+    ) = row
+    # Account, category and payee ids repeat across thousands of rows.
+    return IndexedTransaction(
+        id=transaction_id,
+        date=date,
+        account_id=sys.intern(account_id),
+        category_id=category_id and sys.intern(category_id),
+        payee_id=payee_id and sys.intern(payee_id),
+        amount=amount,
+        transfer=transfer is not None,
+        offbudget=bool(offbudget),
+    )
+
+
+def _load_names(session) -> Dict[str, Dict[str, str]]:
+    """Casefolded name to id, per dimension; the first of duplicates wins."""
+    names: Dict[str, Dict[str, str]] = {}
+    for dimension, table in (
+        ("account", Accounts),
+        ("category", Categories),
+        ("payee", Payees),
+    ):
+        by_name = names[dimension] = {}
+        for row_id, name in session.exec(
+            select(table.id, table.name).where(func.coalesce(table.tombstone, 0) == 0)
+        ):
+            if name:
+                by_name.setdefault(name.casefold(), row_id)
+    return names
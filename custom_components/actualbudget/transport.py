@@ -0,0 +1,128 @@
+"""aiohttp transport for the server calls an open budget session makes."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import logging
+import ssl
+from typing import Any
+
+import aiohttp
+from actual.api.models import Endpoints
+from actual.exceptions import AuthorizationError
+from actual.protobuf_models import SyncRequest, SyncResponse
+
+from .connection import ConnectionKey, Traffic
+
+_LOGGER = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=60, sock_connect=30)
+# Bank sync requests wait for the bank provider behind the server.
+BANK_SYNC_TIMEOUT = aiohttp.ClientTimeout(total=300, sock_connect=30)
+
+
+def ssl_option(cert: str | bool | None) -> ssl.SSLContext | bool:
+    """Translate the entry's ``cert`` setting into aiohttp's ``ssl`` argument.
+
+    Loads the certificate file, so run it in the executor.
+    """
+    if cert is False:
+        return False
+    if cert:
+        return ssl.create_default_context(cafile=cert)
+    return True
+
+
+@dataclass
+class PulledChanges:
+    """A sync response fetched on the event loop, applied later in the executor.
+
+    ``since`` is the session clock the request was built from; the response
+    is only applied if the session still has that clock.
+    """
+
+    actual: Any
+    since: str
+    response: SyncResponse
+
+
+class AsyncTransport:
+    """Sends sync and login requests over Home Assistant's aiohttp session.
+
+    Waiting for the server then costs no executor thread. Requests use the
+    token of the ``actual`` session they are made for, as the blocking client
+    does; ``login`` only fetches a new one.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        key: ConnectionKey,
+        ssl_context: ssl.SSLContext | bool = True,
+    ) -> None:
+        self._session = session
+        self._api_url = key.endpoint.rstrip("/")
+        self._ssl = ssl_context
+
+    async def sync(self, actual, request: SyncRequest, traffic: Traffic) -> SyncResponse:
+        """Post ``request`` to the sync endpoint on behalf of ``actual``.
+
+        Raises ``aiohttp.ClientResponseError`` for error statuses.
+        """
+        content = await self._post(
+            Endpoints.SYNC,
+            traffic,
+            data=SyncRequest.serialize(request),
+            headers=actual.headers(
+                request.fileId,
+                extra_headers={"Content-Type": "application/actual-sync"},
+            ),
+        )
+        return SyncResponse.deserialize(content)
+
+    async def bank_sync(
+        self, actual, endpoint: str, payload: dict, traffic: Traffic
+    ) -> Any:
+        """Post ``payload`` to an authenticated bank sync endpoint."""
+        return await self._post(
+            endpoint,
+            traffic,
+            json=payload,
+            headers=actual.headers(),
+            parse_json=True,
+            timeout=BANK_SYNC_TIMEOUT,
+        )
+
+    async def login(self, password: str, traffic: Traffic) -> str:
+        """Log in with ``password`` and return the new token."""
+        response = await self._post(
+            Endpoints.LOGIN,
+            traffic,
+            json={"loginMethod": "password", "password": password},
+            parse_json=True,
+        )
+        token = (response.get("data") or {}).get("token")
+        if not token:
+            raise AuthorizationError(
+                f"Could not log in to Actual server: {response.get('reason')}"
+            )
+        return token
+
+    async def _post(
+        self,
+        endpoint: str,
+        traffic: Traffic,
+        parse_json: bool = False,
+        timeout: aiohttp.ClientTimeout = REQUEST_TIMEOUT,
+        **kwargs,
+    ):
+        async with self._session.post(
+            f"{self._api_url}/{endpoint}", ssl=self._ssl, timeout=timeout, **kwargs
+        ) as response:
+            content = await response.read()
+            traffic.requests += 1
+            traffic.bytes_received += len(content)
+            response.raise_for_status()
+            if parse_json:
+                return await response.json(content_type=None)
+            return content
@@ -0,0 +1,57 @@
+"""Budget aggregation with a history window matches a run without one."""
+
+import datetime
+
+from actual.database import ZeroBudgets
+import pytest
+from sqlmodel import Session, create_engine, delete
+
+from benchmarks.generate import BudgetShape, generate_budget
+from custom_components.actualbudget.actualbudget import ActualBudget
+from custom_components.actualbudget.aggregation import add_months, aggregate_budgets
+
+HISTORY_MONTHS = 3
+
+
+def _attributes(budget, month_key):
+    """The values behind a budget sensor's current and previous attributes."""
+    index = budget.month_index(month_key)
+    if index < 0:
+        return None
+    previous = budget.month(index - 1) if index > 0 else None
+    return (
+        budget.month(index),
+        previous,
+        budget.total_budgeted(index) if previous else None,
+        budget.accumulated_balance,
+    )
+
+
+@pytest.mark.parametrize("drop_current", [False, True])
+def test_window_starting_at_current_month(tmp_path, drop_current):
+    generate_budget(tmp_path, BudgetShape(accounts=2, categories=4, months=12, transactions=400))
+    today = datetime.date.today()
+    current = today.year * 100 + today.month
+    # No rows between the window start and the current month, so the current
+    # month is the first row inside the window (or, if dropped, none is).
+    last_gap_month = current if drop_current else add_months(current, -1)
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    with Session(engine) as session:
+        session.exec(
+            delete(ZeroBudgets).where(
+                ZeroBudgets.month >= add_months(current, -HISTORY_MONTHS),
+                ZeroBudgets.month <= last_gap_month,
+            )
+        )
+        session.commit()
+
+        full = ActualBudget._build_budgets(aggregate_budgets(session, today))
+        windowed = ActualBudget._build_budgets(
+            aggregate_budgets(session, today, history_months=HISTORY_MONTHS)
+        )
+
+    assert full.keys() == windowed.keys()
+    for category_id, budget in full.items():
+        expected = _attributes(budget, current)
+        assert expected is not None and expected[1] is not None
+        assert _attributes(windowed[category_id], current) == expected